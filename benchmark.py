@@ -0,0 +1,732 @@
+import argparse
+import importlib.util
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+from engines import DuckDBEngine
+from outputs import PartitionedReport, read_report, save_data_to_arrow, save_data_to_parquet
+from profiling import peak_rss_mb, reset_peak_rss
+from script import (
+    REPORT_COLUMNS,
+    accumulate_topics,
+    build_report,
+    extract_counters_parallel,
+    read_counters,
+    save_data_to_csv,
+    transform_data
+)
+from sources import (
+    LOGS_QUERY,
+    DAILY_COUNTERS_QUERY,
+    PostgresSource,
+    ParquetSource,
+    SQLiteSource,
+    compact_logs,
+    extract_logs,
+    extract_daily_counters
+)
+
+
+DB = {
+    'postgres_url': 'localhost',
+    'postgres_user': 'postgres',
+    'postgres_password': 'postgres',
+    'postgres_db': 'forum'
+}
+
+
+def load_generator():
+    # db-generate-data.py нельзя импортировать обычным import из-за дефисов в имени
+    spec = importlib.util.spec_from_file_location('db_generate_data', 'db-generate-data.py')
+    module = importlib.util.module_from_spec(spec)
+    # Модуль регистрируется под своим именем, чтобы процессы generate_parallel могли его найти
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def count_rows():
+    with connect() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT (SELECT COUNT(*) FROM users) + (SELECT COUNT(*) FROM topics)
+                 + (SELECT COUNT(*) FROM comments) + (SELECT COUNT(*) FROM logs)
+        """)
+        return cur.fetchone()[0]
+
+
+def connect(database=None):
+    return psycopg2.connect(
+        host=DB['postgres_url'],
+        database=database or DB['postgres_db'],
+        user=DB['postgres_user'],
+        password=DB['postgres_password']
+    )
+
+
+def postgres_source(database=None):
+    return PostgresSource(
+        DB['postgres_url'],
+        DB['postgres_user'],
+        DB['postgres_password'],
+        database or DB['postgres_db'])
+
+
+def result_size(query, params):
+    # Объём данных, который отдаёт запрос: сумма размеров строк результата
+    with connect() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(pg_column_size(q.*)), 0) FROM ({query}) q",
+            params)
+        return cur.fetchone()
+
+
+def synthetic_logs(rows, days=30, start_date='2025-01-01', seed=0, with_text=False, first_id=1):
+    # Кадр со схемой таблицы logs и долями событий, близкими к db-generate-data.py.
+    # with_text заполняет cookie и extra строками, как при загрузке из БД
+    rng = np.random.default_rng(seed)
+    activity_type = rng.choice(
+        np.arange(1, 9),
+        size=rows,
+        p=[0.25, 0.05, 0.05, 0.04, 0.06, 0.25, 0.04, 0.26])
+    user_id = rng.integers(1, max(rows // 20, 2), size=rows).astype('float64')
+    anonymous = (activity_type == 1) | ((activity_type == 8) & (rng.random(rows) < 0.5))
+    user_id[anonymous] = np.nan
+    server_response = np.full(rows, 200)
+    server_response[activity_type == 5] = np.where(rng.random((activity_type == 5).sum()) < 0.2, 401, 201)
+    seconds = np.sort(rng.integers(0, days * 86400, size=rows))
+    cookie = extra = None
+    if with_text:
+        cookies = np.array([f'{number:032x}' for number in rng.integers(0, 2 ** 63, size=max(rows // 10, 1))],
+                           dtype=object)
+        cookie = cookies[rng.integers(0, len(cookies), size=rows)]
+        extra = np.where(activity_type == 7, 'topic', None)
+        extra[(activity_type == 8) & (rng.random(rows) < 0.3)] = 'comment'
+    return pd.DataFrame({
+        'id': np.arange(first_id, first_id + rows),
+        'time': np.datetime64(start_date, 's') + seconds.astype('timedelta64[s]'),
+        'user_id': user_id,
+        'activity_type': activity_type,
+        'activity_id': rng.integers(1, 1000, size=rows).astype('float64'),
+        'server_response': server_response,
+        'cookie': cookie,
+        'extra': extra
+    })
+
+
+def synthetic_counters(days, start_date='2000-01-01', seed=0):
+    # Дневные счётчики без БД для замеров записи и чтения отчёта
+    rng = np.random.default_rng(seed)
+    comments = rng.integers(0, 5000, size=days)
+    index = pd.Index([day.date() for day in pd.date_range(start_date, periods=days)], name='day')
+    return pd.DataFrame({
+        'registrations': rng.integers(0, 500, size=days),
+        'comments': comments,
+        'anonymous_comments': (comments * rng.random(days)).astype('int64'),
+        'created_topics': rng.integers(50, 300, size=days),
+        'deleted_topics': rng.integers(0, 50, size=days)
+    }, index=index)
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_pushdown(args):
+    params = (args.start_date, args.end_date)
+
+    pandas_time, pandas_report = timed(
+        lambda: transform_data(extract_logs(**DB, start_date=args.start_date, end_date=args.end_date)),
+        args.repeat)
+    pushdown_time, pushdown_report = timed(
+        lambda: build_report(extract_daily_counters(**DB, start_date=args.start_date, end_date=args.end_date)),
+        args.repeat)
+
+    pandas_rows, pandas_bytes = result_size(LOGS_QUERY.format(columns='*'), params)
+    pushdown_rows, pushdown_bytes = result_size(DAILY_COUNTERS_QUERY, params)
+    same = pandas_report.to_csv(index=False) == pushdown_report.to_csv(index=False)
+
+    print(f"{'режим':<10}{'строк':>12}{'байт':>14}{'время, с':>12}")
+    print(f"{'pandas':<10}{pandas_rows:>12}{pandas_bytes:>14}{pandas_time:>12.3f}")
+    print(f"{'pushdown':<10}{pushdown_rows:>12}{pushdown_bytes:>14}{pushdown_time:>12.3f}")
+    print(f"Отчёты совпадают: {'да' if same else 'нет'}")
+
+
+def bench_explain(args):
+    # Проверка, что фильтр по датам использует индекс logs_time_idx, а не полный проход по logs.
+    # Seq Scan запрещается, чтобы план не зависел от объёма данных в тестовой БД
+    params = (args.start_date, args.end_date)
+    failed = False
+    with connect() as conn, conn.cursor() as cur:
+        cur.execute("SET enable_seqscan = off")
+        for name, query in (('logs', LOGS_QUERY.format(columns='*')), ('pushdown', DAILY_COUNTERS_QUERY)):
+            cur.execute(f"EXPLAIN {query}", params)
+            plan = '\n'.join(row[0] for row in cur.fetchall())
+            uses_index = 'logs_time_idx' in plan and 'Seq Scan on logs' not in plan
+            failed = failed or not uses_index
+            print(f"{name}: {'индекс используется' if uses_index else 'полный проход по logs'}")
+            print(plan)
+    if failed:
+        sys.exit(1)
+
+
+def bench_transform(args):
+    print(f"{'строк':>12}{'время, с':>12}{'строк/с':>14}")
+    for rows in args.rows:
+        data = synthetic_logs(rows)
+        elapsed, _ = timed(lambda: transform_data(data), args.repeat)
+        print(f"{rows:>12}{elapsed:>12.3f}{rows / elapsed:>14.0f}")
+        del data
+
+
+def bench_memory(args):
+    # Память кадра логов: все колонки с типами по умолчанию против проекции REPORT_COLUMNS
+    # с компактными типами из compact_logs
+    print(f"{'строк':>12}{'вариант':>12}{'МБ':>10}{'байт/строку':>14}  отчёт совпадает")
+    for rows in args.rows:
+        data = synthetic_logs(rows, with_text=True)
+        compact = compact_logs(data[REPORT_COLUMNS])
+        same = transform_data(data).to_csv(index=False) == transform_data(compact).to_csv(index=False)
+        for name, frame in (('все', data), ('компактно', compact)):
+            size = frame.memory_usage(deep=True).sum()
+            print(f"{rows:>12}{name:>12}{size / 2 ** 20:>10.1f}{size / rows:>14.1f}  {'да' if same else 'нет'}")
+        del data, compact
+
+
+def bench_output(args):
+    # Запись и чтение отчёта в каждом формате, размер файла и совпадение прочитанного с CSV.
+    # Последняя колонка - дописывание одного дня: CSV переписывается целиком,
+    # partitioned переписывает только месяц этого дня
+    print(f"{'дней':>8}{'формат':>13}{'КБ':>10}{'запись, с':>11}{'чтение, с':>11}"
+          f"{'+1 день, с':>12}  совпадает")
+    directory = tempfile.mkdtemp()
+    try:
+        for days in args.days:
+            counters = synthetic_counters(days)
+            data = build_report(counters)
+            last_day = counters.iloc[[-1]]
+            topic_base = int(accumulate_topics(counters.iloc[:-1]).iloc[-1])
+            reference = None
+            for output_format, filename in (('csv', 'report.csv'), ('parquet', 'report.parquet'),
+                                            ('arrow', 'report.arrow'), ('partitioned', 'report')):
+                path = os.path.join(directory, filename)
+                if output_format == 'partitioned':
+                    def write():
+                        shutil.rmtree(path, ignore_errors=True)
+                        PartitionedReport(path).write(data, accumulate_topics(counters))
+
+                    def append():
+                        PartitionedReport(path).write(build_report(last_day, topic_base),
+                                                      accumulate_topics(last_day, topic_base))
+                else:
+                    save = {'csv': save_data_to_csv, 'parquet': save_data_to_parquet,
+                            'arrow': save_data_to_arrow}[output_format]
+
+                    def write():
+                        save(data, path)
+                    append = write
+                write_time, _ = timed(write, args.repeat)
+                read_time, result = timed(lambda: read_report(path, output_format), args.repeat)
+                append_time, _ = timed(append, args.repeat)
+                if os.path.isdir(path):
+                    size = sum(os.path.getsize(os.path.join(root, name))
+                               for root, _, names in os.walk(path) for name in names)
+                else:
+                    size = os.path.getsize(path)
+                result = result[data.columns]
+                if reference is None:
+                    reference = result
+                same = 'да' if result.equals(reference) else 'нет'
+                print(f"{days:>8}{output_format:>13}{size / 1024:>10.1f}{write_time:>11.4f}"
+                      f"{read_time:>11.4f}{append_time:>12.4f}  {same}")
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_workers(args):
+    reference = None
+    print(f"{'процессов':>10}{'время, с':>12}{'ускорение':>12}  совпадает")
+    for workers in args.workers:
+        elapsed, counters = timed(
+            lambda: extract_counters_parallel(
+                postgres_source(),
+                start_date=args.start_date,
+                end_date=args.end_date,
+                workers=workers,
+                shard_days=args.shard_days),
+            args.repeat)
+        report = build_report(counters).to_csv(index=False)
+        if reference is None:
+            reference = (elapsed, report)
+        same = 'да' if report == reference[1] else 'нет'
+        print(f"{workers:>10}{elapsed:>12.3f}{reference[0] / elapsed:>12.2f}  {same}")
+
+
+def generator_db():
+    return {
+        'dbname': DB['postgres_db'],
+        'postgres_user': DB['postgres_user'],
+        'postgres_password': DB['postgres_password'],
+        'postgres_host': DB['postgres_url'],
+        'postgres_port': '5432'
+    }
+
+
+def bench_generator(args):
+    # Генератор пишет в ту же БД, что и остальные замеры: данные добавляются к существующим
+    generator_module = load_generator()
+    start = datetime.strptime(args.start_date, '%Y-%m-%d')
+    end = start + timedelta(days=args.days - 1)
+    print(f"{'flush_size':>12}{'pool_size':>10}{'процессов':>10}{'строк':>10}{'время, с':>12}{'строк/с':>12}")
+    for flush_size, pool_size, workers in itertools.product(args.flush_size, args.pool_size, args.workers):
+        options = {'flush_size': flush_size, 'pool_size': pool_size, 'seed': args.seed}
+        rows_before = count_rows()
+        started = time.perf_counter()
+        if workers > 1:
+            generator_module.generate_parallel(generator_db(), start, end, workers, **options)
+        else:
+            generator = generator_module.DataGenerator(**generator_db(), **options)
+            try:
+                generator.generate_range_data(start, end)
+            finally:
+                generator.cleanup()
+        elapsed = time.perf_counter() - started
+        rows = count_rows() - rows_before
+        print(f"{flush_size:>12}{pool_size:>10}{workers:>10}{rows:>10}"
+              f"{elapsed:>12.3f}{rows / elapsed:>12.0f}")
+
+
+PIPELINE_CHUNK_ROWS = 5_000_000
+# Этапы короче этого времени в проверке регрессий не участвуют: их время в основном шум
+MIN_CHECKED_SECONDS = 0.05
+
+
+def synthetic_chunks(rows, days, start_date, seed):
+    # Набор строится порциями по PIPELINE_CHUNK_ROWS строк, у каждой порции свой seed,
+    # поэтому 100M строк не нужно держать в памяти целиком
+    for number, first_row in enumerate(range(0, rows, PIPELINE_CHUNK_ROWS)):
+        chunk_rows = min(PIPELINE_CHUNK_ROWS, rows - first_row)
+        data = synthetic_logs(chunk_rows, days, start_date, seed + number, with_text=True, first_id=first_row + 1)
+        yield data.astype({'id': 'Int32', 'user_id': 'Int32', 'activity_id': 'Int32'})
+
+
+def build_parquet_dataset(path, rows, days, start_date, seed):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    schema = pa.schema([
+        ('id', pa.int32()),
+        ('time', pa.timestamp('us')),
+        ('user_id', pa.int32()),
+        ('activity_type', pa.int32()),
+        ('activity_id', pa.int32()),
+        ('server_response', pa.int32()),
+        ('cookie', pa.string()),
+        ('extra', pa.string()),
+        ('day', pa.string())
+    ])
+    for number, data in enumerate(synthetic_chunks(rows, days, start_date, seed)):
+        data['day'] = data['time'].dt.strftime('%Y-%m-%d')
+        ds.write_dataset(
+            pa.Table.from_pandas(data, schema=schema, preserve_index=False),
+            os.path.join(path, 'logs'),
+            format='parquet',
+            partitioning=ds.partitioning(pa.schema([('day', pa.string())]), flavor='hive'),
+            basename_template=f'part-{number}-{{i}}.parquet',
+            existing_data_behavior='overwrite_or_ignore')
+
+
+def build_sqlite_dataset(path, rows, days, start_date, seed):
+    # Схема таблиц - та же, что создаёт выгрузка генератора в SQLite
+    load_generator().SQLiteWriter(path, 0).close()
+    with closing(sqlite3.connect(path)) as conn:
+        for data in synthetic_chunks(rows, days, start_date, seed):
+            data['time'] = data['time'].dt.strftime('%Y-%m-%d %H:%M:%S')
+            data = data.astype(object).where(data.notna(), None)
+            conn.executemany("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", data.itertuples(index=False))
+        conn.commit()
+
+
+def scratch_database(name):
+    # Отдельная база со схемой db-init.sql для замеров, которые пишут данные.
+    # Возвращает True, если база создана заново
+    conn = connect()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (name,))
+            if cur.fetchone():
+                return False
+            cur.execute(f'CREATE DATABASE "{name}"')
+    finally:
+        conn.close()
+    with open('db-init.sql') as file, connect(name) as conn, conn.cursor() as cur:
+        cur.execute(file.read())
+    conn.close()
+    return True
+
+
+def build_postgres_dataset(name, rows, days, start_date, seed):
+    with connect(name) as conn, conn.cursor() as cur:
+        # logs.user_id ссылается на users, поэтому сначала создаются все встречающиеся пользователи
+        cur.execute(
+            "INSERT INTO users (id, name) SELECT id, 'user_' || id FROM generate_series(1, %s) id",
+            (max(rows // 20, 2),))
+        for data in synthetic_chunks(rows, days, start_date, seed):
+            buffer = io.StringIO()
+            data.to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            cur.copy_expert(
+                "COPY logs (id, time, user_id, activity_type, activity_id, server_response, cookie, extra) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer)
+        cur.execute("SELECT setval('users_id_seq', (SELECT MAX(id) FROM users))")
+        cur.execute("SELECT setval('logs_id_seq', (SELECT MAX(id) FROM logs))")
+        cur.execute("ANALYZE logs")
+    conn.close()
+
+
+def pipeline_dataset(args, rows):
+    # Набор строится один раз и переиспользуется следующими запусками с теми же параметрами.
+    # Файловые наборы собираются под временным именем и переименовываются в конце,
+    # поэтому прерванная сборка не выдаётся за готовый набор
+    name = f'logs_{rows}_{args.days}_{args.seed}'
+    if args.backend == 'postgres':
+        name = f'{DB["postgres_db"]}_bench_{rows}_{args.days}_{args.seed}'
+        if scratch_database(name):
+            print(f"Заполнение базы {name}: {rows} строк")
+            build_postgres_dataset(name, rows, args.days, args.start_date, args.seed)
+        return name
+    path = os.path.join(args.data_dir, name + ('.sqlite' if args.backend == 'sqlite' else ''))
+    if not os.path.exists(path):
+        print(f"Сборка набора {path}: {rows} строк")
+        os.makedirs(args.data_dir, exist_ok=True)
+        building = path + '.building'
+        if os.path.isdir(building):
+            shutil.rmtree(building)
+        elif os.path.exists(building):
+            os.remove(building)
+        build = build_sqlite_dataset if args.backend == 'sqlite' else build_parquet_dataset
+        build(building, rows, args.days, args.start_date, args.seed)
+        os.replace(building, path)
+    return path
+
+
+def pipeline_source(backend, location):
+    if backend == 'postgres':
+        return postgres_source(location)
+    if backend == 'sqlite':
+        return SQLiteSource(location)
+    return ParquetSource(location)
+
+
+def stage_result(elapsed, rows):
+    return {
+        'seconds': round(elapsed, 6),
+        'rows': rows,
+        'rows_per_second': round(rows / elapsed, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }
+
+
+def run_pipeline(task):
+    backend, location, start_date, end_date, repeat = task
+    source = pipeline_source(backend, location)
+    reset_peak_rss()
+    extract_time, data = timed(lambda: source.read_logs(start_date, end_date, REPORT_COLUMNS), repeat)
+    extract = stage_result(extract_time, len(data))
+    reset_peak_rss()
+    transform_time, report = timed(lambda: transform_data(data), repeat)
+    transform = stage_result(transform_time, len(data))
+    del data
+    reset_peak_rss()
+    with tempfile.TemporaryDirectory() as directory:
+        save_time, _ = timed(lambda: save_data_to_csv(report, os.path.join(directory, 'data.csv')), repeat)
+    return {'extract': extract, 'transform': transform, 'save': stage_result(save_time, len(report))}
+
+
+def run_generator(task):
+    # Пути записи DataGenerator: выгрузка в файлы или COPY в отдельную базу PostgreSQL
+    backend, location, start_date, days, seed = task
+    generator_module = load_generator()
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    options = {'seed': seed}
+    if backend != 'postgres':
+        options.update(export_format=backend, export_path=location)
+    db = {**generator_db(), 'dbname': location}
+    generator = generator_module.DataGenerator(**db, **options)
+    reset_peak_rss()
+    started = time.perf_counter()
+    try:
+        generator.generate_range_data(start, start + timedelta(days=days - 1))
+    finally:
+        generator.cleanup()
+    elapsed = time.perf_counter() - started
+    if backend == 'postgres':
+        with connect(location) as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT (SELECT COUNT(*) FROM users) + (SELECT COUNT(*) FROM topics)
+                     + (SELECT COUNT(*) FROM comments) + (SELECT COUNT(*) FROM logs)
+            """)
+            rows = cur.fetchone()[0]
+        conn.close()
+    else:
+        # Выгрузка в новый путь: последние выданные id равны числу строк в таблицах
+        rows = sum(generator.writer.last_ids.values())
+    return {'insert': stage_result(elapsed, rows)}
+
+
+def spawn(func, task):
+    # Каждый набор замеряется в новом процессе (spawn, а не fork): память родителя
+    # и предыдущих наборов не попадает в замер
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(func, task).result()
+
+
+def run_engine(task):
+    # Отчёт за период одним движком: pandas читает логи порциями по chunk_size,
+    # DuckDB - целиком с лимитом памяти memory_limit
+    engine, backend, location, start_date, end_date, repeat, chunk_size, memory_limit = task
+    source = pipeline_source(backend, location)
+    if engine == 'duckdb':
+        def compute():
+            return DuckDBEngine(source, memory_limit).daily_counters(start_date, end_date)
+    else:
+        def compute():
+            return read_counters(source, start_date, end_date, chunk_size)
+    reset_peak_rss()
+    elapsed, counters = timed(compute, repeat)
+    return {
+        'seconds': round(elapsed, 6),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'report': build_report(counters).to_csv(index=False)
+    }
+
+
+def bench_engines(args):
+    # Сравнение движков на одном наборе: время, пик памяти процесса и совпадение отчётов.
+    # Расхождение отчётов - ошибка, код возврата 1
+    end_date = (datetime.strptime(args.start_date, '%Y-%m-%d') + timedelta(days=args.days - 1)).strftime('%Y-%m-%d')
+    mismatched = []
+    print(f"{'строк':>12}{'движок':>8}{'время, с':>12}{'строк/с':>14}{'peak RSS, МБ':>14}  совпадает")
+    for rows in args.rows:
+        location = pipeline_dataset(args, rows)
+        reference = None
+        for engine in ('pandas', 'duckdb'):
+            result = spawn(
+                run_engine,
+                (engine, args.backend, location, args.start_date, end_date, args.repeat,
+                 args.chunk_size, args.memory_limit))
+            if reference is None:
+                reference = result['report']
+            same = result['report'] == reference
+            if not same:
+                mismatched.append(f"{rows} строк: отчёт {engine} не совпадает с pandas")
+            print(f"{rows:>12}{engine:>8}{result['seconds']:>12.3f}{rows / result['seconds']:>14.0f}"
+                  f"{result['peak_rss_mb']:>14.1f}  {'да' if same else 'нет'}")
+    for line in mismatched:
+        print(line)
+    if mismatched:
+        sys.exit(1)
+
+
+def check_regressions(results, baseline, threshold):
+    # Регрессия - пропускная способность этапа упала больше чем на threshold относительно эталона.
+    # Возвращает описания регрессий и число сравненных этапов
+    failed = []
+    compared = 0
+    for key, stages in results.items():
+        for stage, result in stages.items():
+            reference = baseline.get(key, {}).get(stage)
+            if reference is None or reference['seconds'] < MIN_CHECKED_SECONDS:
+                continue
+            compared += 1
+            ratio = result['rows_per_second'] / reference['rows_per_second']
+            if ratio < 1 - threshold:
+                failed.append(f"{key} {stage}: {result['rows_per_second']:.0f} строк/с "
+                              f"против {reference['rows_per_second']:.0f} в эталоне ({ratio:.0%})")
+    return failed, compared
+
+
+def bench_pipeline(args):
+    end_date = (datetime.strptime(args.start_date, '%Y-%m-%d') + timedelta(days=args.days - 1)).strftime('%Y-%m-%d')
+    results = {}
+    for rows in args.rows:
+        location = pipeline_dataset(args, rows)
+        results[f'{args.backend}/{rows}'] = spawn(
+            run_pipeline,
+            (args.backend, location, args.start_date, end_date, args.repeat))
+    if args.generator_days:
+        if args.backend == 'postgres':
+            location = f'{DB["postgres_db"]}_bench_generator'
+            # Каждый замер генератора пишет в чистую базу
+            conn = connect()
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f'DROP DATABASE IF EXISTS "{location}"')
+            conn.close()
+            scratch_database(location)
+            results[f'generator/{args.backend}'] = spawn(
+                run_generator, (args.backend, location, args.start_date, args.generator_days, args.seed))
+        else:
+            with tempfile.TemporaryDirectory() as directory:
+                location = os.path.join(directory, 'export')
+                results[f'generator/{args.backend}'] = spawn(
+                    run_generator, (args.backend, location, args.start_date, args.generator_days, args.seed))
+    print(f"{'набор':>28}{'этап':>11}{'время, с':>12}{'строк/с':>14}{'peak RSS, МБ':>14}")
+    for key, stages in results.items():
+        for stage, result in stages.items():
+            print(f"{key:>28}{stage:>11}{result['seconds']:>12.3f}{result['rows_per_second']:>14.0f}"
+                  f"{result['peak_rss_mb']:>14.1f}")
+
+    if args.save_baseline:
+        baseline = {
+            'meta': {
+                'backend': args.backend,
+                'days': args.days,
+                'seed': args.seed,
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'machine': platform.machine(),
+                'created': datetime.now().isoformat(timespec='seconds')
+            },
+            'results': results
+        }
+        with open(args.baseline, 'w') as file:
+            json.dump(baseline, file, indent=2, ensure_ascii=False)
+        print(f"Эталон записан в {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        failed, compared = check_regressions(results, baseline['results'], args.threshold)
+        for line in failed:
+            print(f"Регрессия: {line}")
+        if failed:
+            sys.exit(1)
+        if not compared:
+            print(f"В {args.baseline} нет замеров для этих наборов, сравнивать не с чем")
+            return
+        print(f"Регрессий относительно {args.baseline} нет (порог {args.threshold:.0%})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Замеры производительности скрипта агрегации')
+    parser.add_argument('--start_date', type=str, default='2025-01-01',
+                       help='Дата начала периода в формате YYYY-MM-DD')
+    parser.add_argument('--end_date', type=str, default='2025-01-30',
+                       help='Дата окончания периода в формате YYYY-MM-DD')
+    parser.add_argument('--repeat', type=int, default=3,
+                       help='Количество повторов, берётся лучшее время')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    subparsers.add_parser(
+        'pushdown',
+        help='Агрегация в PostgreSQL против выгрузки строк в pandas'
+    ).set_defaults(func=bench_pushdown)
+    subparsers.add_parser(
+        'explain',
+        help='Проверка плана запросов: фильтр по датам должен идти через индекс по time'
+    ).set_defaults(func=bench_explain)
+    transform = subparsers.add_parser(
+        'transform',
+        help='Скорость transform_data на синтетических логах без БД')
+    transform.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000, 50_000_000],
+                           help='Размеры синтетических наборов строк')
+    transform.set_defaults(func=bench_transform)
+    memory = subparsers.add_parser(
+        'memory',
+        help='Память кадра логов: типы по умолчанию против проекции колонок и компактных типов')
+    memory.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000],
+                        help='Размеры синтетических наборов строк')
+    memory.set_defaults(func=bench_memory)
+    output = subparsers.add_parser(
+        'output',
+        help='Запись и чтение отчёта: CSV против Parquet, Arrow IPC и каталога по месяцам')
+    output.add_argument('--days', type=int, nargs='+', default=[365, 3650, 36500],
+                        help='Число дней (строк) в отчёте')
+    output.set_defaults(func=bench_output)
+    workers = subparsers.add_parser(
+        'workers',
+        help='Масштабирование --workers: время и совпадение отчётов для разного числа процессов')
+    workers.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                         help='Проверяемые числа процессов, первое значение - эталон')
+    workers.add_argument('--shard_days', type=int, default=1,
+                         help='Длина отрезка периода в днях')
+    workers.set_defaults(func=bench_workers)
+    generator = subparsers.add_parser(
+        'generator',
+        help='Скорость записи DataGenerator: построчные INSERT (flush_size 0) против COPY')
+    generator.add_argument('--flush_size', type=int, nargs='+', default=[0, 10000],
+                           help='Проверяемые размеры буфера, 0 - построчные INSERT')
+    generator.add_argument('--days', type=int, default=5,
+                           help='Сколько дней логов сгенерировать в каждом режиме')
+    generator.add_argument('--pool_size', type=int, nargs='+', default=[1000],
+                           help='Проверяемые размеры пулов текстов, 0 - Faker на каждую строку')
+    generator.add_argument('--workers', type=int, nargs='+', default=[1],
+                           help='Проверяемые числа процессов генерации')
+    generator.add_argument('--seed', type=int, default=0,
+                           help='Seed генератора')
+    generator.set_defaults(func=bench_generator)
+    pipeline = subparsers.add_parser(
+        'pipeline',
+        help='Этапы extract, transform и save на синтетических наборах, запись генератора, '
+             'эталон в JSON и проверка регрессий')
+    pipeline.add_argument('--backend', choices=['parquet', 'sqlite', 'postgres'], default='parquet',
+                          help='Где хранится набор: каталог Parquet, файл SQLite или отдельная база PostgreSQL')
+    pipeline.add_argument('--rows', type=int, nargs='+',
+                          default=[100_000, 1_000_000, 10_000_000, 100_000_000],
+                          help='Размеры синтетических наборов строк')
+    pipeline.add_argument('--days', type=int, default=30,
+                          help='Сколько дней, начиная с --start_date, покрывает набор')
+    pipeline.add_argument('--seed', type=int, default=0,
+                          help='Seed синтетических наборов и генератора')
+    pipeline.add_argument('--data_dir', type=str, default='bench_data',
+                          help='Каталог для файловых наборов, собранные наборы переиспользуются')
+    pipeline.add_argument('--generator_days', type=int, default=10,
+                          help='Сколько дней сгенерировать DataGenerator, 0 - не замерять генератор')
+    pipeline.add_argument('--baseline', type=str, default='bench_baseline.json',
+                          help='JSON-файл эталонных результатов')
+    pipeline.add_argument('--save_baseline', action='store_true',
+                          help='Записать результаты как эталон вместо проверки')
+    pipeline.add_argument('--threshold', type=float, default=0.2,
+                          help='Допустимое падение строк/с относительно эталона (0.2 - на 20%%)')
+    pipeline.set_defaults(func=bench_pipeline)
+    engines = subparsers.add_parser(
+        'engines',
+        help='--engine pandas против duckdb на синтетических наборах: время, память и совпадение отчётов')
+    engines.add_argument('--backend', choices=['parquet', 'sqlite', 'postgres'], default='parquet',
+                         help='Где хранится набор (для sqlite и postgres DuckDB нужны расширения sqlite и postgres)')
+    engines.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000, 100_000_000],
+                         help='Размеры синтетических наборов строк')
+    engines.add_argument('--days', type=int, default=30,
+                         help='Сколько дней, начиная с --start_date, покрывает набор')
+    engines.add_argument('--seed', type=int, default=0,
+                         help='Seed синтетических наборов')
+    engines.add_argument('--data_dir', type=str, default='bench_data',
+                         help='Каталог для файловых наборов, собранные наборы переиспользуются')
+    engines.add_argument('--chunk_size', type=int, default=1_000_000,
+                         help='Размер порции для pandas')
+    engines.add_argument('--memory_limit', type=str, default='1GB',
+                         help='Лимит памяти DuckDB')
+    engines.set_defaults(func=bench_engines)
+    args = parser.parse_args()
+    args.func(args)
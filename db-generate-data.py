@@ -1,8 +1,401 @@
+import argparse
+import csv
+import functools
+import io
+import json
+import numbers
+import os
 import random
+import sqlite3
+import time
+import uuid
+from array import array
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import psycopg2
 from faker import Faker
 
+from profiling import StageProfiler, profile_stage
+
+
+class IndexedPool:
+    # Множество id с добавлением, удалением и случайным выбором за O(1).
+    # items - плотный массив значений (по нему работает random.choice),
+    # positions - позиция каждого id в items или -1, индексом служит сам id.
+    # id из SERIAL помещаются в int32, поэтому оба массива занимают по 4 байта на элемент
+    def __init__(self, values=()):
+        self.items = array('i')
+        self.positions = array('i')
+        for value in values:
+            self.add(value)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __contains__(self, value):
+        return 0 <= value < len(self.positions) and self.positions[value] >= 0
+
+    def add(self, value):
+        if value in self:
+            return
+        if value >= len(self.positions):
+            grow = max(value + 1, 2 * len(self.positions)) - len(self.positions)
+            self.positions.extend(array('i', [-1]) * grow)
+        self.positions[value] = len(self.items)
+        self.items.append(value)
+
+    def remove(self, value):
+        # Удаляемый элемент замещается последним, поэтому порядок items не сохраняется
+        if value not in self:
+            raise KeyError(value)
+        position = self.positions[value]
+        last = self.items.pop()
+        if last != value:
+            self.items[position] = last
+            self.positions[last] = position
+        self.positions[value] = -1
+
+
+class TextCorpus:
+    # Имена, названия топиков и тексты комментариев генерируются Faker один раз
+    # в пулы по pool_size значений, строки берут значения из пулов через random.choice.
+    # Больше pool_size - разнообразнее тексты, но дольше построение пулов.
+    # pool_size=0 - Faker вызывается на каждую строку, как раньше.
+    # Если задан path, пулы сохраняются в JSON и переиспользуются в следующих запусках
+    def __init__(self, fake, pool_size, path=None):
+        self.fake = fake
+        self.pool_size = pool_size
+        self.pools = None
+        if not pool_size:
+            return
+        if path and os.path.exists(path):
+            with open(path) as corpus_file:
+                pools = json.load(corpus_file)
+            if all(len(values) == pool_size for values in pools.values()):
+                self.pools = pools
+        if self.pools is None:
+            self.pools = {
+                'names': [fake.name() for _ in range(pool_size)],
+                'topic_titles': [fake.sentence(nb_words=3) for _ in range(pool_size)],
+                'comment_texts': [fake.text(max_nb_chars=200) for _ in range(pool_size)]
+            }
+            if path:
+                with open(path, 'w') as corpus_file:
+                    json.dump(self.pools, corpus_file, ensure_ascii=False)
+
+    def name(self):
+        if self.pools is None:
+            return self.fake.name()
+        return random.choice(self.pools['names'])
+
+    def topic_title(self):
+        if self.pools is None:
+            return self.fake.sentence(nb_words=3)
+        return random.choice(self.pools['topic_titles'])
+
+    def comment_text(self):
+        if self.pools is None:
+            return self.fake.text(max_nb_chars=200)
+        return random.choice(self.pools['comment_texts'])
+
+
+class BulkWriter:
+    # Буферизует строки по таблицам и записывает их через COPY FROM STDIN.
+    # Порядок TABLE_COLUMNS соответствует внешним ключам: родительские таблицы
+    # сбрасываются раньше дочерних. id для users, topics и comments выдаются
+    # из блоков nextval, поэтому parent_id и user_id известны до записи строк
+    TABLE_COLUMNS = {
+        'users': ('id', 'name'),
+        'topics': ('id', 'name', 'user_id'),
+        'comments': ('id', 'user_id', 'topic_id', 'parent_id', 'text'),
+        'logs': ('time', 'user_id', 'activity_type', 'activity_id', 'server_response', 'cookie', 'extra')
+    }
+    profiler = None
+
+    def __init__(self, conn, flush_size, id_block_size):
+        self.conn = conn
+        self.cur = conn.cursor()
+        self.flush_size = flush_size
+        self.id_block_size = id_block_size
+        self.buffers = {table: [] for table in self.TABLE_COLUMNS}
+        self.reserved_ids = {}
+
+    def next_id(self, table):
+        ids = self.reserved_ids.get(table)
+        if not ids:
+            self.cur.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                (table, self.id_block_size))
+            # pop() берёт с конца, поэтому блок разворачивается, чтобы id выдавались по возрастанию
+            ids = [row[0] for row in self.cur.fetchall()][::-1]
+            self.reserved_ids[table] = ids
+        return ids.pop()
+
+    def add(self, table, row):
+        buffer = self.buffers[table]
+        buffer.append(row)
+        if len(buffer) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        with profile_stage(self.profiler, 'flush'):
+            for table, columns in self.TABLE_COLUMNS.items():
+                rows = self.buffers[table]
+                if not rows:
+                    continue
+                data = io.StringIO()
+                csv.writer(data).writerows(rows)
+                if self.profiler is not None:
+                    self.profiler.add(size=data.tell())
+                data.seek(0)
+                self.cur.copy_expert(
+                    f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                    data)
+                rows.clear()
+
+    def close(self):
+        self.cur.close()
+
+
+# Объёмы событий за день: число или диапазон [min, max], из которого значение
+# выбирается случайно каждый день. error_rate, если задан, заменяет error_count
+# долей от числа созданных за день топиков
+DEFAULT_PROFILE = {
+    'registration_count': [7, 15],
+    'login_count': [6, 8],
+    'topic_create_count': [7, 17],
+    'activity_count': [35, 55],
+    'delete_topic_count': [5, 7],
+    'logout_count': [5, 8],
+    'error_count': [2, 5],
+    'anonymous_comment_ratio': 0.5,
+    'error_rate': None
+}
+COUNT_KEYS = [
+    'registration_count',
+    'login_count',
+    'topic_create_count',
+    'activity_count',
+    'delete_topic_count',
+    'logout_count',
+    'error_count'
+]
+DEFAULT_POOL_SIZE = 1000
+
+
+def is_number(value):
+    # bool - подкласс int, но в профиле true/false числом не считаются
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def scale_count(key, value, scale):
+    # Количество в профиле - неотрицательное число или диапазон [min, max];
+    # дробные значения (1e6, 1000000.0 или результат --scale) округляются
+    if is_number(value) and value >= 0:
+        return round(value * scale)
+    if isinstance(value, list) and len(value) == 2 and all(is_number(bound) for bound in value) \
+            and 0 <= value[0] <= value[1]:
+        return [round(bound * scale) for bound in value]
+    raise ValueError(f"{key}: ожидается неотрицательное число или диапазон [min, max], получено {value!r}")
+
+
+def load_profile(path=None, scale=1, anonymous_comment_ratio=None, error_rate=None):
+    # ValueError с описанием, если профиль не JSON-объект, в нём есть неизвестные ключи
+    # или значения неподходящего типа
+    profile = dict(DEFAULT_PROFILE)
+    if path:
+        with open(path) as profile_file:
+            loaded = json.load(profile_file)
+        if not isinstance(loaded, dict):
+            raise ValueError("ожидается JSON-объект с ключами как в DEFAULT_PROFILE")
+        unknown = sorted(set(loaded) - set(DEFAULT_PROFILE))
+        if unknown:
+            raise ValueError(f"неизвестные ключи {', '.join(unknown)}; допустимые: {', '.join(DEFAULT_PROFILE)}")
+        profile.update(loaded)
+    for key in COUNT_KEYS:
+        profile[key] = scale_count(key, profile[key], scale)
+    if not is_number(profile['anonymous_comment_ratio']):
+        raise ValueError(f"anonymous_comment_ratio: ожидается число, получено {profile['anonymous_comment_ratio']!r}")
+    if profile['error_rate'] is not None and not is_number(profile['error_rate']):
+        raise ValueError(f"error_rate: ожидается число или null, получено {profile['error_rate']!r}")
+    if anonymous_comment_ratio is not None:
+        profile['anonymous_comment_ratio'] = anonymous_comment_ratio
+    if error_rate is not None:
+        profile['error_rate'] = error_rate
+    return profile
+
+
+class FileWriter:
+    # Общая часть выгрузки в файлы: id для всех таблиц, включая logs, выдаются
+    # локальными счётчиками, продолжая максимальные id уже выгруженных данных
+    TABLE_COLUMNS = {
+        **BulkWriter.TABLE_COLUMNS,
+        'logs': ('id', *BulkWriter.TABLE_COLUMNS['logs'])
+    }
+    profiler = None
+
+    def __init__(self, flush_size):
+        self.flush_size = flush_size or 10000
+        self.buffers = {table: [] for table in self.TABLE_COLUMNS}
+        self.last_ids = {table: self.existing_max_id(table) for table in self.TABLE_COLUMNS}
+
+    def next_id(self, table):
+        self.last_ids[table] += 1
+        return self.last_ids[table]
+
+    def add(self, table, row):
+        if table == 'logs':
+            row = (self.next_id('logs'), *row)
+        buffer = self.buffers[table]
+        buffer.append(row)
+        if len(buffer) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        with profile_stage(self.profiler, 'flush'):
+            for table in self.TABLE_COLUMNS:
+                if self.buffers[table]:
+                    self.write(table, self.buffers[table])
+                    self.buffers[table].clear()
+
+    def close(self):
+        self.flush()
+
+
+class ParquetWriter(FileWriter):
+    # Каталог с подкаталогами users, topics, comments и logs. Логи разбиты по дням
+    # (logs/day=YYYY-MM-DD), что позволяет ParquetSource в sources.py читать только нужные дни
+    def __init__(self, path, flush_size):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.run_id = uuid.uuid4().hex[:8]
+        self.file_number = 0
+        self.schemas = {
+            'users': pa.schema([('id', pa.int32()), ('name', pa.string())]),
+            'topics': pa.schema([('id', pa.int32()), ('name', pa.string()), ('user_id', pa.int32())]),
+            'comments': pa.schema([
+                ('id', pa.int32()),
+                ('user_id', pa.int32()),
+                ('topic_id', pa.int32()),
+                ('parent_id', pa.int32()),
+                ('text', pa.string())
+            ]),
+            'logs': pa.schema([
+                ('id', pa.int32()),
+                ('time', pa.timestamp('us')),
+                ('user_id', pa.int32()),
+                ('activity_type', pa.int32()),
+                ('activity_id', pa.int32()),
+                ('server_response', pa.int32()),
+                ('cookie', pa.string()),
+                ('extra', pa.string())
+            ])
+        }
+        super().__init__(flush_size)
+
+    def existing_max_id(self, table):
+        table_path = os.path.join(self.path, table)
+        if not os.path.isdir(table_path):
+            return 0
+        import pyarrow.dataset as ds
+        ids = ds.dataset(table_path, format='parquet').to_table(columns=['id'])['id']
+        return int(ids.to_pandas().max()) if len(ids) else 0
+
+    def write_file(self, directory, table, rows):
+        os.makedirs(directory, exist_ok=True)
+        self.file_number += 1
+        columns = list(zip(*rows))
+        data = self.pa.Table.from_arrays(
+            [self.pa.array(column, type=field.type) for column, field in zip(columns, self.schemas[table])],
+            schema=self.schemas[table])
+        self.pq.write_table(data, os.path.join(directory, f'part-{self.run_id}-{self.file_number:06d}.parquet'))
+
+    def write(self, table, rows):
+        if table != 'logs':
+            self.write_file(os.path.join(self.path, table), table, rows)
+            return
+        days = defaultdict(list)
+        for row in rows:
+            days[row[1].date()].append(row)
+        for day, day_rows in days.items():
+            self.write_file(os.path.join(self.path, 'logs', f'day={day.isoformat()}'), table, day_rows)
+
+
+class SQLiteWriter(FileWriter):
+    # Файл SQLite с теми же таблицами, что в db-init.sql, для SQLiteSource в sources.py
+    def __init__(self, path, flush_size):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS topics (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                user_id INTEGER NOT NULL REFERENCES users(id)
+            );
+            CREATE TABLE IF NOT EXISTS comments (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER REFERENCES users(id),
+                topic_id INTEGER NOT NULL REFERENCES topics(id),
+                parent_id INTEGER REFERENCES comments(id),
+                text TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS logs (
+                id INTEGER PRIMARY KEY,
+                time TEXT NOT NULL,
+                user_id INTEGER REFERENCES users(id),
+                activity_type INTEGER NOT NULL,
+                activity_id INTEGER,
+                server_response INTEGER NOT NULL,
+                cookie TEXT,
+                extra TEXT
+            );
+            CREATE INDEX IF NOT EXISTS logs_time_idx ON logs (time);
+        """)
+        super().__init__(flush_size)
+
+    def existing_max_id(self, table):
+        return self.conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+
+    def write(self, table, rows):
+        if table == 'logs':
+            rows = [(row[0], row[1].isoformat(sep=' '), *row[2:]) for row in rows]
+        placeholders = ', '.join('?' * len(self.TABLE_COLUMNS[table]))
+        self.conn.executemany(
+            f"INSERT INTO {table} ({', '.join(self.TABLE_COLUMNS[table])}) VALUES ({placeholders})",
+            rows)
+        self.conn.commit()
+
+    def close(self):
+        super().close()
+        self.conn.close()
+
+
+def profiled(method):
+    # Время метода generate_* и число вставленных в нём строк при включённой статистике
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.profiler is None:
+            return method(self, *args, **kwargs)
+        with self.profiler.stage(method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+EXPORT_WRITERS = {
+    'parquet': ParquetWriter,
+    'sqlite': SQLiteWriter
+}
+
 
 class DataGenerator:
     def __init__(
@@ -11,21 +404,40 @@ class DataGenerator:
             postgres_user,
             postgres_password,
             postgres_host,
-            postgres_port):
-        self.conn = psycopg2.connect(
-            dbname=dbname,
-            user=postgres_user,
-            password=postgres_password,
-            host=postgres_host,
-            port=postgres_port
-        )
-
-        self.cur = self.conn.cursor()
+            postgres_port,
+            flush_size=10000,
+            id_block_size=1000,
+            profile=None,
+            seed=None,
+            pool_size=DEFAULT_POOL_SIZE,
+            corpus_path=None,
+            export_format=None,
+            export_path=None,
+            collect_stats=False):
         self.fake = Faker()
+        # Статистика по методам: время, вставленные строки, время сброса буферов и COMMIT.
+        # Пик памяти не отслеживается: этапы слишком короткие и частые
+        self.profiler = StageProfiler(track_memory=False) if collect_stats else None
+        if export_format is not None:
+            # Выгрузка в файлы вместо PostgreSQL, подключение к БД не нужно
+            self.conn = None
+            self.cur = None
+            self.writer = EXPORT_WRITERS[export_format](export_path, flush_size)
+        else:
+            self.conn = psycopg2.connect(
+                dbname=dbname,
+                user=postgres_user,
+                password=postgres_password,
+                host=postgres_host,
+                port=postgres_port
+            )
+            self.cur = self.conn.cursor()
+            # flush_size=0 - старый режим: отдельный INSERT на каждую строку
+            self.writer = BulkWriter(self.conn, flush_size, id_block_size) if flush_size else None
+        if self.writer is not None:
+            self.writer.profiler = self.profiler
 
-        self.MIN_ACTIONS_PER_TYPE = 5
-        self.ANONYMOUS_COMMENT_RATIO = 0.5
-        self.MIN_LOGIN_ERRORS = 2
+        self.profile = {**DEFAULT_PROFILE, **(profile or {})}
         self.ACTIVITY_TYPES = {
             'first_visit': 1,
             'registration': 2,
@@ -36,69 +448,111 @@ class DataGenerator:
             'delete_topic': 7,
             'create_comment': 8
         }
-        self.user_ids = []
-        self.topic_ids = []
+        self.user_ids = IndexedPool()
+        self.topic_ids = IndexedPool()
         self.user_cookies = {}
         self.comment_ids = {}
-        self.logged_users = []
-
-        random.seed(datetime.now().timestamp())
-
-    def get_count_config(self):
-        return {
-            'registration_count': random.randint(
-                self.MIN_ACTIONS_PER_TYPE + 2,
-                self.MIN_ACTIONS_PER_TYPE + 10
-            ),
-            'login_count': random.randint(
-                self.MIN_ACTIONS_PER_TYPE + 1,
-                self.MIN_ACTIONS_PER_TYPE + 3
-            ),
-            'topic_create_count': random.randint(
-                self.MIN_ACTIONS_PER_TYPE + 2,
-                self.MIN_ACTIONS_PER_TYPE + 12
-            ),
-            'activity_count': random.randint(
-                self.MIN_ACTIONS_PER_TYPE + 30,
-                self.MIN_ACTIONS_PER_TYPE + 50
-            ),
-            'delete_topic_count': random.randint(
-                self.MIN_ACTIONS_PER_TYPE,
-                self.MIN_ACTIONS_PER_TYPE + 2
-            ),
-            'logout_count': random.randint(
-                self.MIN_ACTIONS_PER_TYPE,
-                self.MIN_ACTIONS_PER_TYPE + 3),
-            'error_count': random.randint(
-                self.MIN_LOGIN_ERRORS,
-                self.MIN_LOGIN_ERRORS + 3)
-        }
+        self.logged_users = IndexedPool()
+        self.offline_users = IndexedPool()
+
+        # С фиксированным seed одинаковые параметры дают одинаковый набор данных
+        if seed is None:
+            random.seed(datetime.now().timestamp())
+        else:
+            random.seed(seed)
+            self.fake.seed_instance(seed)
+        self.corpus = TextCorpus(self.fake, pool_size, corpus_path)
+
+    def get_count_config(self, plan=None):
+        counts = {key: self.draw_count(self.profile[key]) for key in COUNT_KEYS}
+        if plan is not None:
+            # Регистрации, создание и удаление топиков заданы планом дня (plan_population)
+            counts['registration_count'] = len(plan['users'])
+            counts['topic_create_count'] = len(plan['topics'])
+            counts['delete_topic_count'] = len(plan['deletions'])
+        if self.profile['error_rate'] is not None:
+            counts['error_count'] = round(counts['topic_create_count'] * self.profile['error_rate'])
+        return counts
 
+    def draw_count(self, value):
+        # В профиле количество задаётся числом или диапазоном [min, max]
+        if is_number(value):
+            return round(value)
+        low, high = value
+        return random.randint(round(low), round(high))
+
+    def insert_row(self, table, **values):
+        # Возвращает id новой строки. В режиме BulkWriter id берётся из заранее
+        # зарезервированного блока значений последовательности, без обращения к БД
+        if self.profiler is not None:
+            self.profiler.add(rows=1)
+        if self.writer is not None:
+            row_id = self.writer.next_id(table)
+            columns = BulkWriter.TABLE_COLUMNS[table][1:]
+            self.writer.add(table, (row_id, *(values[column] for column in columns)))
+            return row_id
+        columns = ', '.join(values)
+        placeholders = ', '.join(['%s'] * len(values))
+        self.cur.execute(
+            f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) RETURNING id",
+            tuple(values.values())
+        )
+        return self.cur.fetchone()[0]
+
+    def insert_log(
+            self,
+            time,
+            user_id,
+            activity_type,
+            activity_id,
+            server_response,
+            cookie,
+            extra=None):
+        row = (time, user_id, activity_type, activity_id, server_response, cookie, extra)
+        if self.profiler is not None:
+            self.profiler.add(rows=1)
+        if self.writer is not None:
+            self.writer.add('logs', row)
+            return
+        self.cur.execute("""
+            INSERT INTO logs (time, user_id, activity_type, activity_id, server_response, cookie, extra)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, row)
+
+    def commit(self):
+        # Сброс буферов и COMMIT учитываются раздельно: commit - только задержка COMMIT
+        if self.writer is not None:
+            self.writer.flush()
+        if self.conn is not None:
+            with profile_stage(self.profiler, 'commit'):
+                self.conn.commit()
+
+    @profiled
     def generate_cookie(self):
         return ''.join(random.choices('0123456789abcdef', k=32))
 
+    @profiled
     def generate_users(self, count=1):
         user_ids = []
         for _ in range(count):
-            self.cur.execute(
-                "INSERT INTO users (name) VALUES (%s) RETURNING id",
-                (self.fake.name(),)
-            )
-            user_ids.append(self.cur.fetchone()[0])
-        self.conn.commit()
+            user_ids.append(self.insert_row('users', name=self.corpus.name()))
+        if self.writer is None:
+            self.commit()
         return user_ids
 
+    @profiled
     def generate_topics(self, user_id, count=1):
         topic_ids = []
         for _ in range(count):
-            self.cur.execute(
-                "INSERT INTO topics (name, user_id) VALUES (%s, %s) RETURNING id",
-                (self.fake.sentence(nb_words=3), user_id)
-            )
-            topic_ids.append(self.cur.fetchone()[0])
-        self.conn.commit()
+            topic_ids.append(self.insert_row(
+                'topics',
+                name=self.corpus.topic_title(),
+                user_id=user_id))
+        if self.writer is None:
+            self.commit()
         return topic_ids
 
+    @profiled
     def generate_time(
             self,
             base_time,
@@ -113,56 +567,60 @@ class DataGenerator:
         end_of_day = base_time.replace(hour=23, minute=59, second=59)
         return min(new_time, end_of_day)
 
-    def generate_first_visit(self, date):
+    @profiled
+    def generate_first_visit(self, date, cookie=None):
         time = self.generate_time(
             date, 
             hour_shift=random.randint(6, 16))
-        cookie = self.generate_cookie()
-        self.cur.execute("""
-            INSERT INTO logs (time, user_id, activity_type, activity_id, server_response, cookie)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (time, None, self.ACTIVITY_TYPES['first_visit'], None, 200, cookie))
+        cookie = cookie or self.generate_cookie()
+        self.insert_log(time, None, self.ACTIVITY_TYPES['first_visit'], None, 200, cookie)
         return cookie, time
 
+    @profiled
     def generate_registration(
             self,
             date,
             user_ids,
+            offline_users,
             user_cookies,
             user_last_action,
-            count):
-        for _ in range(count):
-            cookie, time_reg = self.generate_first_visit(date)
+            count,
+            planned=None):
+        # planned - пары (id пользователя, cookie), строки users которых уже записаны
+        for user_id, cookie in planned if planned is not None else [(None, None)] * count:
+            cookie, time_reg = self.generate_first_visit(date, cookie)
             registration_time = self.generate_time(
                 time_reg, 
                 min_minutes=2, 
                 max_minutes=5)
-            last_user_id = self.generate_users()[0]
+            last_user_id = user_id or self.generate_users()[0]
             user_cookies[last_user_id] = cookie
-            user_ids.append(last_user_id)
-            self.cur.execute("""
-                INSERT INTO logs (time, user_id, activity_type, activity_id, server_response, cookie)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (registration_time, last_user_id, self.ACTIVITY_TYPES['registration'], None, 201, cookie))
+            user_ids.add(last_user_id)
+            offline_users.add(last_user_id)
+            self.insert_log(registration_time, last_user_id, self.ACTIVITY_TYPES['registration'], None, 201, cookie)
             user_last_action[last_user_id] = registration_time
 
+    @profiled
     def generate_login(
             self,
             user_cookies,
             user_last_action,
-            user_ids,
+            offline_users,
             login_count,
-            logged_users):
-        available_for_login = list(set(user_ids) - set(logged_users))
-        if not available_for_login:
+            logged_users,
+            required=()):
+        # required - пользователи, которые должны войти в этот день (авторы топиков по плану),
+        # они входят первыми и учитываются в login_count
+        required = [user_id for user_id in required if user_id in offline_users]
+        if not offline_users:
             print("Нет доступных пользователей для входа в систему")
             return
 
-        for _ in range(login_count):
-            if not available_for_login:
+        for index in range(max(login_count, len(required))):
+            if not offline_users:
                 break
-            user_id = random.choice(available_for_login)
-            available_for_login.remove(user_id)
+            user_id = required[index] if index < len(required) else random.choice(offline_users)
+            offline_users.remove(user_id)
             login_time = self.generate_time(
                 user_last_action[user_id], 
                 hour_shift=random.randint(5, 10), 
@@ -171,25 +629,21 @@ class DataGenerator:
             if user_id not in user_cookies:
                 user_cookies[user_id] = self.generate_cookie()
             cookie = user_cookies[user_id]
-            self.cur.execute("""
-                INSERT INTO logs (time, user_id, activity_type, activity_id, server_response, cookie)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (login_time, user_id, self.ACTIVITY_TYPES['login'], None, 200, cookie))
+            self.insert_log(login_time, user_id, self.ACTIVITY_TYPES['login'], None, 200, cookie)
             user_last_action[user_id] = login_time
-            logged_users.append(user_id)
+            logged_users.add(user_id)
 
+    @profiled
     def generate_create_topic_with_error(
             self,
             date,
-            user_ids,
+            offline_users,
             user_cookies,
             user_last_action,
-            logged_users,
             count):
         for _ in range(count):
-            available_users = list(set(user_ids) - set(logged_users))
-            if available_users:
-                user_id = random.choice(available_users)
+            if offline_users:
+                user_id = random.choice(offline_users)
                 time = self.generate_time(
                     user_last_action[user_id], 
                     min_minutes=5, 
@@ -197,46 +651,42 @@ class DataGenerator:
                 if user_id not in user_cookies:
                     user_cookies[user_id] = self.generate_cookie()
                 cookie = user_cookies[user_id]
-                self.cur.execute("""
-                    INSERT INTO logs (time, user_id, activity_type, activity_id, server_response, cookie)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (time, user_id, self.ACTIVITY_TYPES['create_topic'], None, 401, cookie))
+                self.insert_log(time, user_id, self.ACTIVITY_TYPES['create_topic'], None, 401, cookie)
+                user_last_action[user_id] = time
             else:
                 cookie, time = self.generate_first_visit(date)
-                self.cur.execute("""
-                    INSERT INTO logs (time, user_id, activity_type, activity_id, server_response, cookie)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (time, None, self.ACTIVITY_TYPES['create_topic'], None, 401, cookie))
+                self.insert_log(time, None, self.ACTIVITY_TYPES['create_topic'], None, 401, cookie)
 
+    @profiled
     def generate_create_topic(
             self,
             user_cookies,
             user_last_action,
             topic_ids,
             count,
-            logged_users):
+            logged_users,
+            planned=None):
+        # planned - пары (id топика, автор), строки topics которых уже записаны
         if not logged_users:
             print("Нет авторизованных пользователей для создания топиков")
             return
 
-        for _ in range(count):
+        for index in range(count if planned is None else len(planned)):
             if not logged_users:
                 break
-            user_id = random.choice(logged_users)
+            topic_id, user_id = (None, random.choice(logged_users)) if planned is None else planned[index]
             time = self.generate_time(
                 user_last_action[user_id], 
                 hour_shift=random.randint(0, 3), 
                 min_minutes=5, 
                 max_minutes=15)
             cookie = user_cookies[user_id]
-            topic_id = self.generate_topics(user_id)[0]
-            self.cur.execute("""
-                INSERT INTO logs (time, user_id, activity_type, activity_id, server_response, cookie)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (time, user_id, self.ACTIVITY_TYPES['create_topic'], topic_id, 201, cookie))
+            topic_id = topic_id or self.generate_topics(user_id)[0]
+            self.insert_log(time, user_id, self.ACTIVITY_TYPES['create_topic'], topic_id, 201, cookie)
             user_last_action[user_id] = time
-            topic_ids.append(topic_id)
+            topic_ids.add(topic_id)
 
+    @profiled
     def generate_activity(
             self,
             date,
@@ -251,8 +701,8 @@ class DataGenerator:
             return
         
         for _ in range(count):
-            is_anonymous = random.random() > self.ANONYMOUS_COMMENT_RATIO
-            user_id = None if is_anonymous else random.choice(logged_users)
+            is_anonymous = random.random() < self.profile['anonymous_comment_ratio']
+            user_id = None if is_anonymous or not logged_users else random.choice(logged_users)
             topic_id = random.choice(topic_ids)
 
             if user_id:
@@ -269,75 +719,69 @@ class DataGenerator:
                     min_minutes=1, 
                     max_minutes=5)
                 
-            self.cur.execute("""
-                INSERT INTO logs (time, user_id, activity_type, activity_id, server_response, cookie)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (time, user_id, self.ACTIVITY_TYPES['view_topic'], topic_id, 200, cookie))
+            self.insert_log(time, user_id, self.ACTIVITY_TYPES['view_topic'], topic_id, 200, cookie)
 
             if user_id:
                 user_last_action[user_id] = time
             comment_time = self.generate_time(time, min_minutes=10, max_minutes=20)
-            comment_text = self.fake.text(max_nb_chars=200)
+            comment_text = self.corpus.comment_text()
             if topic_id not in comment_ids:
-                comment_ids[topic_id] = []
-
-            if random.random() < 0.5 or comment_ids[topic_id] == []:
-                self.cur.execute("""
-                    INSERT INTO comments (user_id, topic_id, text)
-                    VALUES (%s, %s, %s)
-                    RETURNING id
-                 """, (user_id, topic_id, comment_text))
+                comment_ids[topic_id] = array('i')
+
+            if random.random() < 0.5 or not comment_ids[topic_id]:
+                parent_id = None
                 extra = 'topic'
             else:
-                comment_id = random.choice(comment_ids[topic_id])
-                self.cur.execute("""
-                    INSERT INTO comments (user_id, topic_id, parent_id, text)
-                    VALUES (%s, %s, %s, %s)
-                    RETURNING id
-                """, (user_id, topic_id, comment_id, comment_text))
+                parent_id = random.choice(comment_ids[topic_id])
                 extra = 'comment'
 
-            comment_ids[topic_id].append(self.cur.fetchone()[0])
-            self.cur.execute("""
-                INSERT INTO logs (time, user_id, activity_type, activity_id, server_response, cookie, extra)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (comment_time, user_id, self.ACTIVITY_TYPES['create_comment'], topic_id, 201, cookie, extra))
+            comment_ids[topic_id].append(self.insert_row(
+                'comments',
+                user_id=user_id,
+                topic_id=topic_id,
+                parent_id=parent_id,
+                text=comment_text))
+            self.insert_log(comment_time, user_id, self.ACTIVITY_TYPES['create_comment'], topic_id, 201, cookie, extra)
             if user_id:
                 user_last_action[user_id] = comment_time
 
+    @profiled
     def generate_delete_topic(
             self,
             user_cookies,
             user_last_action,
             topic_ids,
             count,
-            logged_users):
+            logged_users,
+            comment_ids,
+            planned=None):
+        # planned - пары (id топика, кто удаляет)
         if not logged_users or not topic_ids:
             print("Нет авторизованных пользователей или топиков для удаления")
             return
 
-        for _ in range(count):
+        for index in range(count if planned is None else len(planned)):
             if not logged_users or not topic_ids:
                 break
-            user_id = random.choice(logged_users)
+            topic_id, user_id = (None, random.choice(logged_users)) if planned is None else planned[index]
             time = self.generate_time(
                 user_last_action[user_id],
                 min_minutes=5,
                 max_minutes=15)
             cookie = user_cookies[user_id]
-            topic_id = random.choice(topic_ids)
-            self.cur.execute("""
-                INSERT INTO logs (time, user_id, activity_type, activity_id, server_response, cookie)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (time, user_id, self.ACTIVITY_TYPES['delete_topic'], topic_id, 204, cookie))
+            topic_id = topic_id or random.choice(topic_ids)
+            self.insert_log(time, user_id, self.ACTIVITY_TYPES['delete_topic'], topic_id, 204, cookie)
             user_last_action[user_id] = time
             topic_ids.remove(topic_id)
+            comment_ids.pop(topic_id, None)
 
+    @profiled
     def generate_logout(
             self,
             user_cookies,
             user_last_action,
             logged_users,
+            offline_users,
             count):
         if not logged_users:
             print("Нет авторизованных пользователей для выхода из системы")
@@ -347,15 +791,19 @@ class DataGenerator:
             if not logged_users:
                 break
             user_id = random.choice(logged_users)
-            time = user_last_action[user_id] + timedelta(minutes=random.randint(5, 10))
+            last_action = user_last_action[user_id]
+            # Выход не переносится на следующий день, иначе события пользователя за следующий
+            # день могут оказаться раньше его выхода
+            time = min(
+                last_action + timedelta(minutes=random.randint(5, 10)),
+                last_action.replace(hour=23, minute=59, second=59))
             cookie = user_cookies[user_id]
-            self.cur.execute("""
-                INSERT INTO logs (time, user_id, activity_type, activity_id, server_response, cookie)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (time, user_id, self.ACTIVITY_TYPES['logout'], None, 200, cookie))
+            self.insert_log(time, user_id, self.ACTIVITY_TYPES['logout'], None, 200, cookie)
             user_last_action[user_id] = time
             logged_users.remove(user_id)
+            offline_users.add(user_id)
 
+    @profiled
     def generate_daily_logs(
             self,
             date,
@@ -363,44 +811,56 @@ class DataGenerator:
             topic_ids,
             comment_ids,
             user_cookies,
-            logged_users):
-        user_last_action = {user_id: date for user_id in user_ids}
+            logged_users,
+            offline_users,
+            plan=None):
+        # Время последнего действия по умолчанию - начало дня, словарь хранит только
+        # пользователей, действовавших в этот день. plan - заранее выбранные регистрации,
+        # создаваемые и удаляемые топики дня (режим --workers, см. plan_population)
+        user_last_action = defaultdict(lambda: date)
+        counts = self.get_count_config(plan)
+        planned = plan or {'users': None, 'topics': None, 'deletions': None}
+        required = [] if plan is None else list(dict.fromkeys(
+            user_id for _, user_id in plan['topics'] + plan['deletions']))
 
         self.generate_registration(
             date,
             user_ids,
+            offline_users,
             user_cookies,
             user_last_action,
-            self.get_count_config()['registration_count'])
+            counts['registration_count'],
+            planned['users'])
         
         self.generate_login(
             user_cookies,
             user_last_action,
-            user_ids,
-            self.get_count_config()['login_count'],
-            logged_users)
+            offline_users,
+            counts['login_count'],
+            logged_users,
+            required)
         
         self.generate_create_topic_with_error(
             date,
-            user_ids,
+            offline_users,
             user_cookies,
             user_last_action,
-            logged_users,
-            self.get_count_config()['error_count'])
+            counts['error_count'])
         
         self.generate_create_topic(
             user_cookies,
             user_last_action,
             topic_ids,
-            self.get_count_config()['topic_create_count'],
-            logged_users)
+            counts['topic_create_count'],
+            logged_users,
+            planned['topics'])
         
         self.generate_activity(
             date,
             user_cookies,
             user_last_action,
             topic_ids,
-            self.get_count_config()['activity_count'],
+            counts['activity_count'],
             logged_users,
             comment_ids)
         
@@ -408,20 +868,28 @@ class DataGenerator:
             user_cookies,
             user_last_action,
             topic_ids,
-            self.get_count_config()['delete_topic_count'],
-            logged_users)
+            counts['delete_topic_count'],
+            logged_users,
+            comment_ids,
+            planned['deletions'])
         
         self.generate_logout(
             user_cookies,
             user_last_action,
             logged_users,
-            self.get_count_config()['logout_count'])
+            offline_users,
+            counts['logout_count'])
         
-        self.conn.commit()
+        self.commit()
 
+    @profiled
     def generate_month_data(self, year, month):
         start_date = datetime(year, month, 1)
-        for day in range(30):
+        self.generate_range_data(start_date, start_date + timedelta(days=29))
+
+    @profiled
+    def generate_range_data(self, start_date, end_date, plans=None):
+        for day in range((end_date - start_date).days + 1):
             current_date = start_date + timedelta(days=day)
             self.generate_daily_logs(
                 current_date,
@@ -429,25 +897,366 @@ class DataGenerator:
                 self.topic_ids,
                 self.comment_ids,
                 self.user_cookies,
-                self.logged_users)
+                self.logged_users,
+                self.offline_users,
+                None if plans is None else plans[day])
+
+    @profiled
+    def plan_population(self, start_date, end_date):
+        # Пользователи и топики всего периода для --workers. Строки users и topics
+        # записываются заранее одним процессом, а для каждого дня запоминается, кто
+        # регистрируется (с cookie), какие топики создаются (с автором) и какие удаляются
+        # (с тем, кто удаляет). События по плану пишет процесс, которому достался день.
+        # Начальное состояние - set_state, оно не изменяется
+        users = list(self.user_ids)
+        live_topics = IndexedPool(self.topic_ids)
+        plans = []
+        for _ in range((end_date - start_date).days + 1):
+            counts = self.get_count_config()
+            new_users = [(user_id, self.generate_cookie()) for user_id in self.generate_users(counts['registration_count'])]
+            users.extend(user_id for user_id, _ in new_users)
+            topics = []
+            deletions = []
+            if users:
+                for _ in range(counts['topic_create_count']):
+                    author = random.choice(users)
+                    topic_id = self.generate_topics(author)[0]
+                    topics.append((topic_id, author))
+                    live_topics.add(topic_id)
+                for _ in range(min(counts['delete_topic_count'], len(live_topics))):
+                    topic_id = random.choice(live_topics)
+                    live_topics.remove(topic_id)
+                    deletions.append((topic_id, random.choice(users)))
+            plans.append({'users': new_users, 'topics': topics, 'deletions': deletions})
+        self.commit()
+        return plans
+
+    def set_state(self, state):
+        # Пользователи, топики и комментарии, созданные до запуска генерации (см. load_state)
+        logged = set(state['logged_users'])
+        self.user_ids = IndexedPool(state['user_ids'])
+        self.logged_users = IndexedPool(user_id for user_id in state['user_ids'] if user_id in logged)
+        self.offline_users = IndexedPool(user_id for user_id in state['user_ids'] if user_id not in logged)
+        self.user_cookies = dict(state['user_cookies'])
+        self.topic_ids = IndexedPool(state['topic_ids'])
+        self.comment_ids = {topic_id: array('i', ids) for topic_id, ids in state['comment_ids'].items()}
 
     def cleanup(self):
-        self.cur.close()
-        self.conn.close()
+        if self.writer is not None:
+            self.writer.close()
+        if self.conn is not None:
+            self.cur.close()
+            self.conn.close()
 
 
-if __name__ == "__main__":
-    generator = DataGenerator(
-        dbname="forum",
-        postgres_user="postgres",
-        postgres_password="postgres",
-        postgres_host="postgres",
-        postgres_port="5432"
+def connect_db(db):
+    return psycopg2.connect(
+        dbname=db['dbname'],
+        user=db['postgres_user'],
+        password=db['postgres_password'],
+        host=db['postgres_host'],
+        port=db['postgres_port']
     )
+
+
+def load_state(conn):
+    # Состояние форума по уже записанным данным: пользователи, кто из них сейчас
+    # авторизован (последнее событие входа/выхода - вход), последний cookie,
+    # неудалённые топики и комментарии к ним
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM users ORDER BY id")
+        user_ids = [row[0] for row in cur.fetchall()]
+        cur.execute("""
+            SELECT user_id FROM (
+                SELECT DISTINCT ON (user_id) user_id, activity_type
+                FROM logs
+                WHERE activity_type IN (3, 4) AND user_id IS NOT NULL
+                ORDER BY user_id, id DESC
+            ) last_session
+            WHERE activity_type = 3
+        """)
+        logged_users = [row[0] for row in cur.fetchall()]
+        cur.execute("""
+            SELECT DISTINCT ON (user_id) user_id, cookie
+            FROM logs
+            WHERE user_id IS NOT NULL
+            ORDER BY user_id, id DESC
+        """)
+        user_cookies = dict(cur.fetchall())
+        cur.execute("""
+            SELECT id FROM topics t
+            WHERE NOT EXISTS (
+                SELECT 1 FROM logs l WHERE l.activity_type = 7 AND l.activity_id = t.id
+            )
+            ORDER BY id
+        """)
+        topic_ids = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT topic_id, id FROM comments ORDER BY id")
+        live_topics = set(topic_ids)
+        comment_ids = {}
+        for topic_id, comment_id in cur.fetchall():
+            if topic_id in live_topics:
+                comment_ids.setdefault(topic_id, []).append(comment_id)
+    return {
+        'user_ids': user_ids,
+        'logged_users': logged_users,
+        'user_cookies': user_cookies,
+        'topic_ids': topic_ids,
+        'comment_ids': comment_ids
+    }
+
+
+def range_state(state, plans, first_day):
+    # Состояние форума к началу отрезка, который начинается с дня first_day периода:
+    # записанное до запуска и всё, что по плану зарегистрировано, создано и удалено
+    # в предыдущих днях. Кто авторизован к концу предыдущего отрезка, неизвестно,
+    # поэтому со второго отрезка все пользователи начинают день без входа
+    user_ids = list(state['user_ids'])
+    user_cookies = dict(state['user_cookies'])
+    topic_ids = list(state['topic_ids'])
+    deleted = set()
+    for plan in plans[:first_day]:
+        user_ids.extend(user_id for user_id, _ in plan['users'])
+        user_cookies.update(plan['users'])
+        topic_ids.extend(topic_id for topic_id, _ in plan['topics'])
+        deleted.update(topic_id for topic_id, _ in plan['deletions'])
+    topic_ids = [topic_id for topic_id in topic_ids if topic_id not in deleted]
+    return {
+        'user_ids': user_ids,
+        'logged_users': state['logged_users'] if first_day == 0 else [],
+        'user_cookies': user_cookies,
+        'topic_ids': topic_ids,
+        'comment_ids': {
+            topic_id: ids for topic_id, ids in state['comment_ids'].items() if topic_id not in deleted
+        }
+    }
+
+
+def generate_range_worker(task):
+    db, options, state, plans, start_date, end_date = task
+    generator = DataGenerator(**db, **options)
+    try:
+        generator.set_state(state)
+        generator.generate_range_data(start_date, end_date, plans)
+    finally:
+        generator.cleanup()
+    return start_date, end_date, generator.profiler
+
+
+def generate_parallel(db, start_date, end_date, workers, **options):
+    # Сначала один процесс записывает пользователей и топики всего периода (plan_population),
+    # затем период делится на непрерывные отрезки дней, каждый отрезок генерирует свой
+    # процесс со своим подключением. Процесс отрезка видит всех пользователей и топики,
+    # созданные к его первому дню (range_state), и пишет события своих дней, в том числе
+    # регистрации, создание и удаление топиков по плану. id берутся блоками
+    # из последовательностей, поэтому блоки процессов не пересекаются. Не переходят между
+    # отрезками только авторизация пользователей и комментарии, созданные в отрезке
+    if options.get('corpus_path') and options.get('pool_size', DEFAULT_POOL_SIZE):
+        # Пулы строятся один раз, процессы читают их из файла
+        TextCorpus(Faker(), options.get('pool_size', DEFAULT_POOL_SIZE), options['corpus_path'])
+
+    conn = connect_db(db)
+    try:
+        state = load_state(conn)
+    finally:
+        conn.close()
+
+    planner = DataGenerator(**db, **options)
+    try:
+        planner.set_state(state)
+        plans = planner.plan_population(start_date, end_date)
+    finally:
+        planner.cleanup()
+
+    days = (end_date - start_date).days + 1
+    workers = min(workers, days)
+    tasks = []
+    first_day = 0
+    for index in range(workers):
+        last_day = first_day + days // workers + (1 if index < days % workers else 0) - 1
+        worker_options = dict(options)
+        if worker_options.get('seed') is not None:
+            # seed без сдвига использует plan_population
+            worker_options['seed'] += index + 1
+        tasks.append((
+            db,
+            worker_options,
+            range_state(state, plans, first_day),
+            plans[first_day:last_day + 1],
+            start_date + timedelta(days=first_day),
+            start_date + timedelta(days=last_day)))
+        first_day = last_day + 1
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [(start_date, end_date, planner.profiler)] + list(pool.map(generate_range_worker, tasks))
+
+
+INTEGRITY_CHECKS = {
+    'logs_with_unknown_topic': """
+        SELECT COUNT(*) FROM logs l
+        WHERE l.activity_type IN (5, 6, 7, 8)
+          AND l.activity_id IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM topics t WHERE t.id = l.activity_id)
+    """,
+    'logs_with_unknown_user': """
+        SELECT COUNT(*) FROM logs l
+        WHERE l.user_id IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM users u WHERE u.id = l.user_id)
+    """,
+    'replies_to_other_topic': """
+        SELECT COUNT(*) FROM comments c
+        JOIN comments parent ON parent.id = c.parent_id
+        WHERE parent.topic_id <> c.topic_id
+    """,
+    'events_before_registration': """
+        SELECT COUNT(*) FROM logs l
+        JOIN logs registration ON registration.user_id = l.user_id AND registration.activity_type = 2
+        WHERE l.time < registration.time
+    """,
+    'user_events_out_of_order': """
+        SELECT COUNT(*) FROM (
+            SELECT time < LAG(time) OVER (PARTITION BY user_id, CAST(time AS DATE) ORDER BY id) AS backwards
+            FROM logs
+            WHERE user_id IS NOT NULL
+        ) user_events
+        WHERE backwards
+    """
+}
+
+
+def check_integrity(conn):
+    # Число нарушений по каждой проверке: ссылки логов и комментариев на существующие
+    # строки и неубывание времени событий каждого пользователя за день в порядке записи.
+    # Порядок сравнивается внутри дня: с --workers дни одного пользователя пишут разные
+    # процессы одновременно, а события одного дня - всегда один процесс
+    results = {}
+    with conn.cursor() as cur:
+        for name, query in INTEGRITY_CHECKS.items():
+            cur.execute(query)
+            results[name] = cur.fetchone()[0]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Генерация логов форума')
+    parser.add_argument('--flush_size', type=int, default=10000,
+                        help='Размер буфера строк для COPY; 0 - отдельный INSERT на каждую строку')
+    parser.add_argument('--id_block_size', type=int, default=1000,
+                        help='Сколько id резервировать за одно обращение к последовательности')
+    parser.add_argument('--start_date', type=str, default='2025-01-01',
+                        help='Первый день генерации в формате YYYY-MM-DD')
+    parser.add_argument('--end_date', type=str, default='2025-01-30',
+                        help='Последний день генерации в формате YYYY-MM-DD')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='JSON-файл с объёмами событий за день (ключи как в DEFAULT_PROFILE)')
+    parser.add_argument('--scale', type=float, default=1,
+                        help='Множитель для всех объёмов событий профиля')
+    parser.add_argument('--anonymous_ratio', type=float, default=None,
+                        help='Доля анонимных комментариев')
+    parser.add_argument('--error_rate', type=float, default=None,
+                        help='Доля неудачных попыток создать топик от числа созданных топиков')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed генератора случайных чисел для воспроизводимых данных')
+    parser.add_argument('--pool_size', type=int, default=DEFAULT_POOL_SIZE,
+                        help='Размер пулов имён и текстов; 0 - вызывать Faker для каждой строки')
+    parser.add_argument('--corpus', type=str, default=None,
+                        help='JSON-файл для сохранения и повторного использования пулов текстов')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Число процессов, между которыми делится период генерации')
+    parser.add_argument('--export_format', choices=sorted(EXPORT_WRITERS), default=None,
+                        help='Записывать данные в файлы (parquet или sqlite) вместо PostgreSQL')
+    parser.add_argument('--export_path', type=str, default=None,
+                        help='Каталог Parquet или файл SQLite для --export_format')
+    parser.add_argument('--check', action='store_true',
+                        help='Проверить целостность данных после генерации')
+    parser.add_argument('--stats', type=str, nargs='?', const='-', default=None,
+                        help='Записать статистику методов generate_*, сброса буферов и COMMIT в JSON-файл '
+                             '(без имени файла - вывести в stdout)')
+    args = parser.parse_args()
+    start_date = datetime.strptime(args.start_date, '%Y-%m-%d')
+    end_date = datetime.strptime(args.end_date, '%Y-%m-%d')
+    if end_date < start_date:
+        parser.error('Дата окончания не может быть раньше даты начала')
+    if args.export_format and not args.export_path:
+        parser.error('Для --export_format нужен --export_path')
+    if args.export_format and (args.workers > 1 or args.check):
+        parser.error('--export_format не используется вместе с --workers и --check')
+    try:
+        profile = load_profile(args.profile, args.scale, args.anonymous_ratio, args.error_rate)
+    except (OSError, ValueError) as e:
+        parser.error(f'Некорректный профиль {args.profile}: {e}')
+
+    db = {
+        'dbname': "forum",
+        'postgres_user': "postgres",
+        'postgres_password': "postgres",
+        'postgres_host': "postgres",
+        'postgres_port': "5432"
+    }
+    options = {
+        'flush_size': args.flush_size,
+        'id_block_size': args.id_block_size,
+        'profile': profile,
+        'seed': args.seed,
+        'pool_size': args.pool_size,
+        'corpus_path': args.corpus,
+        'export_format': args.export_format,
+        'export_path': args.export_path,
+        'collect_stats': args.stats is not None
+    }
     try:
-        generator.generate_month_data(2025, 1)
+        started = time.perf_counter()
+        if args.workers > 1:
+            # Статистика процессов суммируется
+            profilers = [profiler for _, _, profiler in generate_parallel(db, start_date, end_date, args.workers, **options)]
+        else:
+            generator = DataGenerator(**db, **options)
+            try:
+                generator.generate_range_data(start_date, end_date)
+            finally:
+                generator.cleanup()
+            profilers = [generator.profiler]
+        elapsed = time.perf_counter() - started
         print("Данные успешно сгенерированы")
+        if args.stats is not None:
+            profiler = StageProfiler(track_memory=False)
+            for worker_profiler in profilers:
+                profiler.merge(worker_profiler)
+            stages = profiler.report()
+            rows = sum(stats['rows'] for stats in stages.values())
+            commit = stages.get('commit')
+            stats = {
+                'run': {
+                    'start_date': args.start_date,
+                    'end_date': args.end_date,
+                    'workers': args.workers,
+                    'flush_size': args.flush_size,
+                    'export_format': args.export_format
+                },
+                'wall_seconds': round(elapsed, 6),
+                'rows_inserted': rows,
+                'rows_per_second': round(rows / elapsed, 1),
+                'commit_latency_seconds': {
+                    'mean': round(commit['wall_seconds'] / commit['calls'], 6),
+                    'max': commit['max_call_seconds']
+                } if commit else None,
+                'methods': stages
+            }
+            if args.stats == '-':
+                print(json.dumps(stats, indent=2, ensure_ascii=False))
+            else:
+                with open(args.stats, 'w') as file:
+                    json.dump(stats, file, indent=2, ensure_ascii=False)
+                print(f"Статистика генерации сохранена в файл {args.stats}")
+        if args.check:
+            conn = connect_db(db)
+            try:
+                violations = {name: count for name, count in check_integrity(conn).items() if count}
+            finally:
+                conn.close()
+            if violations:
+                print(f"Найдены нарушения целостности: {violations}")
+            else:
+                print("Нарушений целостности не найдено")
     except Exception as e:
         print(f"Ошибка при генерации данных: {e}")
-    finally:
-        generator.cleanup()
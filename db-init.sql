@@ -39,6 +39,22 @@ CREATE TABLE IF NOT EXISTS logs (
     FOREIGN KEY (activity_type) REFERENCES activity_types(id)
 );
 
+CREATE INDEX IF NOT EXISTS logs_time_idx ON logs (time);
+
+-- NOTIFY о новых строках logs для script.py --follow --notify
+CREATE OR REPLACE FUNCTION notify_logs_new() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('logs_new', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS logs_notify ON logs;
+CREATE TRIGGER logs_notify
+    AFTER INSERT ON logs
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_logs_new();
+
 INSERT INTO activity_types (id, name) VALUES 
     (1, 'first_visit'),
     (2, 'registration'),
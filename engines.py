@@ -0,0 +1,96 @@
+import os
+
+import pandas as pd
+
+from sources import COUNTER_COLUMNS, next_day
+
+
+ENGINES = ['pandas', 'duckdb']
+# Те же определения, что в aggregate_logs и DAILY_COUNTERS_QUERY. CAST через TIMESTAMP
+# нужен для SQLite, где time хранится текстом. Группировка по номеру колонки: в Parquet
+# есть колонка каталога day, и GROUP BY day относился бы к ней
+DUCKDB_COUNTERS_QUERY = """
+    SELECT CAST(CAST(time AS TIMESTAMP) AS DATE) AS day,
+           COUNT(*) FILTER (WHERE activity_type = 2 AND user_id IS NOT NULL) AS registrations,
+           COUNT(*) FILTER (WHERE activity_type = 8) AS comments,
+           COUNT(*) FILTER (WHERE activity_type = 8 AND user_id IS NULL) AS anonymous_comments,
+           COUNT(*) FILTER (WHERE activity_type = 5 AND server_response <> 401) AS created_topics,
+           COUNT(*) FILTER (WHERE activity_type = 7) AS deleted_topics
+    FROM {logs}
+    WHERE {period}
+    GROUP BY 1
+    ORDER BY 1
+"""
+
+
+def quote(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class DuckDBEngine:
+    # Дневные счётчики в DuckDB: строки logs не загружаются в pandas, DuckDB читает источник
+    # потоково в несколько потоков (threads) и не выходит за memory_limit, при нехватке
+    # памяти промежуточные данные сбрасываются в temp_directory. Parquet читается напрямую
+    # с отсечением каталогов дней, PostgreSQL и SQLite - через расширения postgres и sqlite
+    # (ATTACH загружает их сам) с передачей фильтра по time в источник.
+    # Отчёт по счётчикам строит тот же build_report
+    name = 'duckdb'
+
+    def __init__(self, source, memory_limit=None, threads=None, temp_directory=None):
+        self.source = source
+        self.memory_limit = memory_limit
+        self.threads = threads
+        self.temp_directory = temp_directory
+
+    def connect(self):
+        import duckdb
+        conn = duckdb.connect()
+        if self.memory_limit:
+            conn.execute(f"SET memory_limit = {quote(self.memory_limit)}")
+        if self.threads:
+            conn.execute(f"SET threads = {int(self.threads)}")
+        if self.temp_directory:
+            conn.execute(f"SET temp_directory = {quote(self.temp_directory)}")
+        # Порядок строк агрегации не важен, без него DuckDB держит в памяти меньше буферов
+        conn.execute("SET preserve_insertion_order = false")
+        return conn
+
+    def logs_relation(self, conn, start_date, end_date):
+        # Таблица logs источника и условие на период: (logs, period, параметры)
+        source = self.source
+        if source.name == 'parquet':
+            path = os.path.join(source.path, 'logs', '**', '*.parquet')
+            logs = f"read_parquet({quote(path)}, hive_partitioning = true, hive_types = {{'day': VARCHAR}})"
+            return logs, "day >= ? AND day <= ?", [start_date, end_date]
+        if source.name == 'sqlite':
+            conn.execute(f"ATTACH {quote(source.path)} AS logs_db (TYPE sqlite, READ_ONLY)")
+            # Текстовое сравнение, как в SQLiteSource, чтобы работал индекс logs_time_idx
+            return "logs_db.logs", "time >= ? AND time < ?", [start_date, next_day(end_date)]
+        params = f'host={source.host} user={source.user} password={source.password} dbname={source.dbname}'
+        conn.execute(f"ATTACH {quote(params)} AS logs_db (TYPE postgres, READ_ONLY)")
+        return ("logs_db.public.logs",
+                "time >= CAST(? AS TIMESTAMP) AND time < CAST(? AS TIMESTAMP)",
+                [start_date, next_day(end_date)])
+
+    def daily_counters(self, start_date, end_date):
+        # Тот же формат, что у fold_counters и daily_counters источников
+        conn = self.connect()
+        try:
+            logs, period, params = self.logs_relation(conn, start_date, end_date)
+            rows = conn.execute(DUCKDB_COUNTERS_QUERY.format(logs=logs, period=period), params).fetchall()
+        finally:
+            conn.close()
+        counters = pd.DataFrame.from_records(rows, columns=['day'] + COUNTER_COLUMNS)
+        return counters.set_index('day').astype('int64')
+
+    def explain(self, start_date, end_date):
+        # План с фактическим временем операторов (EXPLAIN ANALYZE)
+        conn = self.connect()
+        try:
+            logs, period, params = self.logs_relation(conn, start_date, end_date)
+            rows = conn.execute(
+                "EXPLAIN ANALYZE " + DUCKDB_COUNTERS_QUERY.format(logs=logs, period=period),
+                params).fetchall()
+        finally:
+            conn.close()
+        return '\n'.join(row[-1] for row in rows)
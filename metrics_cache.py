@@ -0,0 +1,98 @@
+import sqlite3
+from datetime import date
+
+import pandas as pd
+
+
+class MetricsCache:
+    # Локальное хранилище дневных счётчиков в SQLite. Для каждого дня хранится
+    # watermark - максимальный logs.id на момент расчёта: если в logs появились строки
+    # за этот день с id больше watermark, день считается устаревшим и пересчитывается.
+    # В state хранится идентификатор источника (bind), счётчики другого источника не используются
+    def __init__(self, path, columns):
+        self.columns = list(columns)
+        self.conn = sqlite3.connect(path)
+        counter_columns = ',\n'.join(f'{column} INTEGER NOT NULL' for column in self.columns)
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS daily_metrics (
+                day TEXT PRIMARY KEY,
+                has_logs INTEGER NOT NULL,
+                watermark INTEGER NOT NULL,
+                {counter_columns}
+            )
+        """)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def bind(self, fingerprint, max_log_id):
+        # Кэш очищается, если он заполнен из другого источника (или источник не записан)
+        # либо если в источнике нет строк с id до сохранённого watermark: база пересоздана,
+        # id начались заново, и устаревшие дни по watermark уже не найти.
+        # Возвращает True, если кэш был очищен
+        rows, watermark = self.conn.execute("SELECT COUNT(*), MAX(watermark) FROM daily_metrics").fetchone()
+        watermark = max(watermark or 0, int(self.get_state('watermark', 0)))
+        cleared = False
+        if self.get_state('source') != fingerprint or watermark > max_log_id:
+            cleared = rows > 0
+            self.clear()
+        self.set_state('source', fingerprint)
+        return cleared
+
+    def load(self, start_date, end_date):
+        columns = ', '.join(['day', 'has_logs', 'watermark'] + self.columns)
+        rows = self.conn.execute(
+            f"SELECT {columns} FROM daily_metrics WHERE day BETWEEN ? AND ? ORDER BY day",
+            (start_date, end_date)
+        ).fetchall()
+        cached = pd.DataFrame.from_records(
+            rows,
+            columns=['day', 'has_logs', 'watermark'] + self.columns)
+        cached['day'] = [date.fromisoformat(day) for day in cached['day']]
+        return cached.set_index('day')
+
+    def store(self, days, counters, watermark):
+        # days - все дни пересчитанного отрезка, counters - счётчики только для дней с логами
+        rows = []
+        for day in days:
+            if day in counters.index:
+                values = [int(value) for value in counters.loc[day, self.columns]]
+                rows.append((day.isoformat(), 1, watermark, *values))
+            else:
+                rows.append((day.isoformat(), 0, watermark, *[0] * len(self.columns)))
+        placeholders = ', '.join('?' * (len(self.columns) + 3))
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO daily_metrics VALUES ({placeholders})",
+            rows)
+        self.conn.commit()
+
+    def update(self, counters, watermark):
+        # Режим --follow: счётчики изменившихся дней и общий watermark записываются
+        # одной транзакцией, поэтому после перезапуска они согласованы
+        placeholders = ', '.join('?' * (len(self.columns) + 3))
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO daily_metrics VALUES ({placeholders})",
+            [
+                (day.isoformat(), 1, watermark, *[int(value) for value in counters.loc[day, self.columns]])
+                for day in counters.index
+            ])
+        self.conn.execute("INSERT OR REPLACE INTO state VALUES ('watermark', ?)", (str(watermark),))
+        self.conn.commit()
+
+    def get_state(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_state(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO state VALUES (?, ?)", (key, str(value)))
+        self.conn.commit()
+
+    def clear(self):
+        self.conn.execute("DELETE FROM daily_metrics")
+        self.conn.execute("DELETE FROM state")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
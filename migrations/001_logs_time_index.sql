@@ -0,0 +1,6 @@
+-- Индекс по logs.time для баз, созданных до его появления в db-init.sql.
+-- CONCURRENTLY не блокирует запись в logs, поэтому файл выполняется вне транзакции:
+-- docker exec -i postgres psql -U postgres -d forum < migrations/001_logs_time_index.sql
+CREATE INDEX CONCURRENTLY IF NOT EXISTS logs_time_idx ON logs (time);
+
+ANALYZE logs;
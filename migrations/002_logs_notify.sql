@@ -0,0 +1,15 @@
+-- Уведомление о новых строках logs для script.py --follow --notify.
+-- Триггер уровня оператора: один NOTIFY на INSERT или COPY, а не на каждую строку:
+-- docker exec -i postgres psql -U postgres -d forum < migrations/002_logs_notify.sql
+CREATE OR REPLACE FUNCTION notify_logs_new() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('logs_new', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS logs_notify ON logs;
+CREATE TRIGGER logs_notify
+    AFTER INSERT ON logs
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_logs_new();
@@ -0,0 +1,132 @@
+import os
+from datetime import date
+
+import pandas as pd
+
+
+REPORT_FORMATS = ['csv', 'parquet', 'arrow', 'partitioned']
+DEFAULT_OUTPUTS = {
+    'csv': 'data.csv',
+    'parquet': 'data.parquet',
+    'arrow': 'data.arrow',
+    'partitioned': 'report'
+}
+
+
+def report_schema(with_topic_count=False):
+    # Явная схема отчёта: типы колонок не зависят от данных конкретного запуска
+    # (например, колонка из одних пропусков остаётся float64, а не null)
+    import pyarrow as pa
+    fields = [
+        ('date', pa.date32()),
+        ('number_of_new_users', pa.int64()),
+        ('anonymous_comments_ratio', pa.float64()),
+        ('comments_count', pa.int64()),
+        ('topic_count_change', pa.float64())
+    ]
+    if with_topic_count:
+        fields.append(('topic_count', pa.int64()))
+    return pa.schema(fields)
+
+
+def report_table(data, schema):
+    import pyarrow as pa
+    return pa.Table.from_pandas(data[schema.names], schema=schema, preserve_index=False)
+
+
+def save_data_to_parquet(data, filename):
+    import pyarrow.parquet as pq
+    pq.write_table(report_table(data, report_schema()), filename)
+
+
+def save_data_to_arrow(data, filename):
+    # Файловый формат Arrow IPC (Feather v2): читается без разбора и копирования
+    import pyarrow.feather as feather
+    feather.write_feather(report_table(data, report_schema()), filename, compression='uncompressed')
+
+
+def read_report(path, output_format):
+    # Чтение отчёта обратно в pandas, даты - объекты date, как в build_report
+    if output_format == 'csv':
+        data = pd.read_csv(path)
+        data['date'] = [date.fromisoformat(day) for day in data['date']]
+        return data
+    if output_format == 'partitioned':
+        return PartitionedReport(path).read()
+    if output_format == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+    else:
+        import pyarrow.feather as feather
+        table = feather.read_table(path)
+    return table.to_pandas(date_as_object=True)
+
+
+class PartitionedReport:
+    # Каталог отчёта с разбиением по месяцам: path/month=YYYY-MM/data.parquet.
+    # Запись работает как upsert по дате: переписываются только месяцы, в которые попали
+    # дни нового отчёта, строки за эти дни заменяются, остальные строки месяца сохраняются.
+    # Вместе с отчётом хранится накопленное число топиков topic_count, чтобы следующий
+    # запуск (например, за один день) продолжил topic_count_change с последнего записанного дня
+    file_name = 'data.parquet'
+
+    def __init__(self, path):
+        self.path = path
+
+    def partition_path(self, month):
+        return os.path.join(self.path, f'month={month}', self.file_name)
+
+    def months(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(
+            name.split('=', 1)[1]
+            for name in os.listdir(self.path)
+            if name.startswith('month=') and os.path.exists(os.path.join(self.path, name, self.file_name)))
+
+    def read_partition(self, month):
+        import pyarrow.parquet as pq
+        path = self.partition_path(month)
+        if not os.path.exists(path):
+            return None
+        return pq.read_table(path, schema=report_schema(with_topic_count=True)).to_pandas(date_as_object=True)
+
+    def read(self):
+        import pyarrow.dataset as ds
+        schema = report_schema(with_topic_count=True)
+        if not self.months():
+            return pd.DataFrame(columns=schema.names)
+        # Каталог month= не входит в схему: месяц и так виден по колонке date
+        dataset = ds.dataset(self.path, format='parquet', schema=schema, exclude_invalid_files=True)
+        return dataset.to_table().sort_by('date').to_pandas(date_as_object=True)
+
+    def topic_base(self, start_date):
+        # Накопленное число топиков на последний записанный день раньше start_date
+        # или None, если более ранних дней в каталоге нет
+        start = date.fromisoformat(start_date)
+        for month in reversed([month for month in self.months() if month <= start_date[:7]]):
+            data = self.read_partition(month)
+            earlier = data[data['date'] < start]
+            if not earlier.empty:
+                return int(earlier['topic_count'].iloc[-1])
+        return None
+
+    def write(self, data, topic_counts):
+        # data - отчёт build_report, topic_counts - накопленное число топиков по тем же дням.
+        # Возвращает список переписанных месяцев
+        import pyarrow.parquet as pq
+        data = data.assign(topic_count=topic_counts.to_numpy())
+        months = pd.Series([day.isoformat()[:7] for day in data['date']], index=data.index)
+        schema = report_schema(with_topic_count=True)
+        for month, rows in data.groupby(months):
+            existing = self.read_partition(month)
+            if existing is not None:
+                existing = existing[~existing['date'].isin(set(rows['date']))]
+                rows = pd.concat([existing, rows], ignore_index=True)
+            rows = rows.sort_values('date')
+            path = self.partition_path(month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Запись во временный файл и os.replace: при сбое в каталоге остаётся прежняя версия месяца
+            pq.write_table(report_table(rows, schema), path + '.tmp')
+            os.replace(path + '.tmp', path)
+        return sorted(set(months))
@@ -0,0 +1,147 @@
+import pstats
+import resource
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+
+def reset_peak_rss():
+    # В Linux пик RSS процесса сбрасывается записью в clear_refs, тогда peak_rss_mb
+    # относится к одному этапу. В других системах пик считается с начала процесса
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2 ** 10
+    except OSError:
+        pass
+    # ru_maxrss в Linux - килобайты, в macOS - байты
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+class StageProfiler:
+    # Метрики по этапам: время (wall и CPU), число вызовов, строки и байты, пик памяти.
+    # Этапы могут быть вложенными: пока работает вложенный этап, время внешнего не идёт,
+    # поэтому сумма времени этапов равна общему времени без двойного счёта.
+    # track_memory сбрасывает пик RSS на границах этапов; для частых мелких этапов
+    # (методы генератора) его лучше выключить
+    def __init__(self, track_memory=True):
+        self.track_memory = track_memory
+        self.stages = {}
+        self.active = []
+
+    def stats(self, name):
+        if name not in self.stages:
+            self.stages[name] = {
+                'calls': 0,
+                'wall_seconds': 0.0,
+                'cpu_seconds': 0.0,
+                'max_call_seconds': 0.0,
+                'rows': 0,
+                'bytes': 0,
+                'peak_rss_mb': 0.0
+            }
+        return self.stages[name]
+
+    def pause(self, name, wall_started, cpu_started):
+        stats = self.stats(name)
+        stats['wall_seconds'] += time.perf_counter() - wall_started
+        stats['cpu_seconds'] += time.process_time() - cpu_started
+        if self.track_memory:
+            stats['peak_rss_mb'] = max(stats['peak_rss_mb'], peak_rss_mb())
+            reset_peak_rss()
+
+    @contextmanager
+    def stage(self, name):
+        if self.active:
+            self.pause(*self.active[-1])
+        elif self.track_memory:
+            reset_peak_rss()
+        call_started = time.perf_counter()
+        self.active.append([name, call_started, time.process_time()])
+        try:
+            yield self.stats(name)
+        finally:
+            self.pause(*self.active.pop())
+            stats = self.stats(name)
+            stats['calls'] += 1
+            stats['max_call_seconds'] = max(stats['max_call_seconds'], time.perf_counter() - call_started)
+            if self.active:
+                self.active[-1][1:] = [time.perf_counter(), time.process_time()]
+
+    def add(self, rows=0, size=0):
+        # Строки и байты (size) относятся к самому внутреннему активному этапу
+        if self.active:
+            stats = self.stats(self.active[-1][0])
+            stats['rows'] += rows
+            stats['bytes'] += size
+
+    def merge(self, other):
+        # Метрики другого процесса (например, процесса --workers): время суммируется
+        for name, other_stats in other.stages.items():
+            stats = self.stats(name)
+            for key, value in other_stats.items():
+                if key in ('max_call_seconds', 'peak_rss_mb'):
+                    stats[key] = max(stats[key], value)
+                else:
+                    stats[key] += value
+
+    def report(self):
+        stages = {}
+        for name, stats in self.stages.items():
+            stats = dict(stats)
+            stats['rows_per_second'] = round(stats['rows'] / stats['wall_seconds'], 1) if stats['wall_seconds'] else None
+            for key in ('wall_seconds', 'cpu_seconds', 'max_call_seconds'):
+                stats[key] = round(stats[key], 6)
+            stats['peak_rss_mb'] = round(stats['peak_rss_mb'], 1) if self.track_memory else None
+            stages[name] = stats
+        return stages
+
+
+def profile_stage(profiler, name):
+    # Этап профилировщика или пустой контекст, если профилирование выключено
+    return nullcontext() if profiler is None else profiler.stage(name)
+
+
+def profile_frame(profiler, data):
+    # Строки и объём в памяти загруженного кадра
+    if profiler is not None:
+        profiler.add(len(data), int(data.memory_usage(deep=True).sum()))
+
+
+def profile_chunks(profiler, name, chunks):
+    # Получение каждой порции относится к этапу name, обработка порции - к этапу,
+    # из которого читается итератор
+    chunks = iter(chunks)
+    while True:
+        with profile_stage(profiler, name):
+            chunk = next(chunks, None)
+            if chunk is not None:
+                profile_frame(profiler, chunk)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def cprofile_top(profile, limit=20):
+    # Самые дорогие по суммарному времени функции из cProfile.Profile
+    stats = pstats.Stats(profile)
+    rows = []
+    for (filename, line, function), (_, calls, own_time, cumulative_time, _) in stats.stats.items():
+        rows.append({
+            'function': f'{filename}:{line}({function})',
+            'calls': calls,
+            'own_seconds': round(own_time, 6),
+            'cumulative_seconds': round(cumulative_time, 6)
+        })
+    rows.sort(key=lambda row: row['cumulative_seconds'], reverse=True)
+    return rows[:limit]
@@ -1,53 +1,328 @@
+import os
+import cProfile
+import json
+import time
+import numpy as np
 import pandas as pd
-import psycopg2
-from psycopg2 import sql
 import argparse
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
 
+from engines import ENGINES, DuckDBEngine
+from metrics_cache import MetricsCache
+from outputs import (
+    DEFAULT_OUTPUTS,
+    REPORT_FORMATS,
+    PartitionedReport,
+    save_data_to_arrow,
+    save_data_to_parquet
+)
+from profiling import StageProfiler, cprofile_top, profile_chunks, profile_frame, profile_stage
+from sketches import (
+    DEFAULT_PRECISION,
+    SKETCH_COLUMNS,
+    SketchStore,
+    daily_sketches,
+    empty_sketches,
+    history_start,
+    merge_sketches,
+    range_uniques,
+    uniques_report
+)
+from sessions import (
+    DEFAULT_PARTITIONS,
+    DEFAULT_TIMEOUT_MINUTES,
+    SESSION_COLUMNS,
+    SessionPartitions,
+    empty_session_stats,
+    merge_session_stats,
+    session_events,
+    session_stats,
+    sessionize,
+    sessions_report
+)
+from threads import thread_stats
+# extract_logs импортируется для прежних вызовов script.extract_logs
+from sources import COUNTER_COLUMNS, LogsListener, PostgresSource, SQLiteSource, ParquetSource, extract_logs
 
-def extract_logs(
-        postgres_url,
-        postgres_user,
-        postgres_password,
-        postgres_db,
+
+# Колонки logs, которые нужны для расчёта отчёта
+REPORT_COLUMNS = ['time', 'user_id', 'activity_type', 'server_response']
+FOLLOW_COLUMNS = ['id'] + REPORT_COLUMNS
+REGISTRATION, NAMED_COMMENT, ANONYMOUS_COMMENT, CREATED_TOPIC, DELETED_TOPIC, OTHER_EVENTS = range(6)
+
+
+def aggregate_logs(data):
+    # Один проход по порции: каждой строке назначается категория (индекс в COUNTER_COLUMNS
+    # или OTHER_EVENTS), и все счётчики по дням получаются одним np.bincount
+    # по ключу "номер дня * число категорий + категория"
+    if data.empty:
+        return empty_counters()
+    activity_type = data['activity_type'].to_numpy()
+    anonymous = data['user_id'].isna().to_numpy()
+    category = np.select(
+        [
+            (activity_type == 2) & ~anonymous,
+            (activity_type == 8) & anonymous,
+            activity_type == 8,
+            (activity_type == 5) & (data['server_response'].to_numpy() != 401),
+            activity_type == 7
+        ],
+        [REGISTRATION, ANONYMOUS_COMMENT, NAMED_COMMENT, CREATED_TOPIC, DELETED_TOPIC],
+        OTHER_EVENTS
+    )
+    day = data['time'].to_numpy().astype('datetime64[D]').astype('int64')
+    first_day = day.min()
+    days_count = day.max() - first_day + 1
+    categories_count = OTHER_EVENTS + 1
+    counts = np.bincount(
+        (day - first_day) * categories_count + category,
+        minlength=days_count * categories_count
+    ).reshape(days_count, categories_count)
+    observed = counts.sum(axis=1) > 0
+    counts = counts[observed]
+    observed_days = np.flatnonzero(observed) + first_day
+    counters = pd.DataFrame({
+        'registrations': counts[:, REGISTRATION],
+        'comments': counts[:, NAMED_COMMENT] + counts[:, ANONYMOUS_COMMENT],
+        'anonymous_comments': counts[:, ANONYMOUS_COMMENT],
+        'created_topics': counts[:, CREATED_TOPIC],
+        'deleted_topics': counts[:, DELETED_TOPIC]
+    }, index=pd.Index(observed_days.astype('datetime64[D]').tolist(), name='day'))
+    return counters.astype('int64')
+
+
+def merge_counters(counters, partial):
+    if counters is None:
+        return partial
+    return counters.add(partial, fill_value=0).astype('int64')
+
+
+def empty_counters():
+    return pd.DataFrame(columns=COUNTER_COLUMNS, dtype='int64')
+
+
+def fold_counters(data):
+    # data - либо DataFrame целиком, либо итератор порций из read_logs_chunks источника.
+    # Каждая порция сворачивается в счётчики по дням, поэтому память зависит
+    # от числа дней, а не от числа строк в logs
+    if isinstance(data, pd.DataFrame):
+        data = [data]
+    counters = None
+    for chunk in data:
+        counters = merge_counters(counters, aggregate_logs(chunk))
+    return empty_counters() if counters is None else counters
+
+
+def split_date_range(start_date, end_date, shard_days):
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    shards = []
+    while start <= end:
+        shard_end = min(start + timedelta(days=shard_days - 1), end)
+        shards.append((start.strftime('%Y-%m-%d'), shard_end.strftime('%Y-%m-%d')))
+        start = shard_end + timedelta(days=1)
+    return shards
+
+
+def read_counters(source, start_date, end_date, chunk_size=None, profiler=None):
+    extracted_rows = profiler.stats('extract')['rows'] if profiler is not None else 0
+    if chunk_size:
+        logs = profile_chunks(
+            profiler,
+            'extract',
+            source.read_logs_chunks(start_date, end_date, chunk_size, REPORT_COLUMNS))
+    else:
+        with profile_stage(profiler, 'extract'):
+            logs = source.read_logs(start_date, end_date, REPORT_COLUMNS)
+            profile_frame(profiler, logs)
+    with profile_stage(profiler, 'aggregate'):
+        counters = fold_counters(logs)
+        if profiler is not None:
+            # Свёрнуто столько строк, сколько получено на этапе extract
+            profiler.add(profiler.stats('extract')['rows'] - extracted_rows)
+    return counters
+
+
+def extract_shard_counters(task):
+    # Выполняется в отдельном процессе со своим подключением к источнику.
+    # С profile вместе со счётчиками возвращаются метрики этапов процесса
+    source, start_date, end_date, chunk_size, profile = task
+    profiler = StageProfiler() if profile else None
+    return read_counters(source, start_date, end_date, chunk_size, profiler), profiler
+
+
+def extract_counters_parallel(
+        source,
         start_date,
-        end_date):
-    try:
-        conn = psycopg2.connect(
-            host=postgres_url,
-            database=postgres_db,
-            user=postgres_user,
-            password=postgres_password
-        )
-
-        query = sql.SQL("SELECT * FROM logs WHERE DATE(time) BETWEEN %s AND %s")
-        data = pd.read_sql_query(
-            query.as_string(conn),
-            conn,
-            params=(start_date, end_date)
-        )
-        return data
+        end_date,
+        workers,
+        shard_days=7,
+        chunk_size=None,
+        profiler=None):
+    # Период делится на непересекающиеся отрезки по shard_days дней, каждый отрезок
+    # извлекается и сворачивается в счётчики в своём процессе. Накопительная сумма
+    # по топикам считается в build_report уже по объединённым счётчикам,
+    # поэтому границы отрезков на неё не влияют. Метрики этапов процессов суммируются
+    # в profiler, этап workers - общее время параллельной части в родительском процессе
+    tasks = [
+        (source, shard_start, shard_end, chunk_size, profiler is not None)
+        for shard_start, shard_end in split_date_range(start_date, end_date, shard_days)
+    ]
+    with profile_stage(profiler, 'workers'):
+        if workers == 1:
+            partials = list(map(extract_shard_counters, tasks))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                partials = list(pool.map(extract_shard_counters, tasks))
+    counters = None
+    for partial, shard_profiler in partials:
+        counters = merge_counters(counters, partial)
+        if shard_profiler is not None:
+            profiler.merge(shard_profiler)
+    return empty_counters() if counters is None else counters
+
+
+def group_days(days):
+    # Список дней -> непрерывные отрезки (start_date, end_date)
+    ranges = []
+    for day in sorted(days):
+        if ranges and ranges[-1][1] + timedelta(days=1) == day:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [(start.isoformat(), end.isoformat()) for start, end in ranges]
+
+
+def extract_counters_cached(
+        source,
+        start_date,
+        end_date,
+        cache,
+        compute_counters):
+    # Дни, которых нет в кэше или которые устарели, пересчитываются через compute_counters
+    # непрерывными отрезками, остальные берутся из кэша
+    days = [day.date() for day in pd.date_range(start_date, end_date)]
+    cached = cache.load(start_date, end_date)
+    stale_days = set()
+    if not cached.empty:
+        for day, max_id in source.stale_days(int(cached['watermark'].min()), start_date, end_date):
+            if day in cached.index and max_id > cached.loc[day, 'watermark']:
+                stale_days.add(day)
+    missing_days = [day for day in days if day not in cached.index or day in stale_days]
+    if missing_days:
+        watermark = source.max_log_id()
+
+    cache.hits += len(days) - len(missing_days)
+    cache.misses += len(missing_days)
+    cache.stale += len(stale_days)
+    for range_start, range_end in group_days(missing_days):
+        counters = compute_counters(range_start, range_end)
+        range_days = [day for day in missing_days if range_start <= day.isoformat() <= range_end]
+        cache.store(range_days, counters, watermark)
+
+    cached = cache.load(start_date, end_date)
+    return cached.loc[cached['has_logs'] == 1, COUNTER_COLUMNS].astype('int64')
+
 
+def read_sketches(source, start_date, end_date, precision, chunk_size=None):
+    # Дневные скетчи уникальных; порции и отрезки объединяются по регистрам
+    if chunk_size:
+        logs = source.read_logs_chunks(start_date, end_date, chunk_size, SKETCH_COLUMNS)
+    else:
+        logs = [source.read_logs(start_date, end_date, SKETCH_COLUMNS)]
+    sketches = None
+    for chunk in logs:
+        sketches = merge_sketches(sketches, daily_sketches(chunk, precision))
+    return empty_sketches() if sketches is None else sketches
+
+
+def extract_sketches_cached(source, start_date, end_date, store, chunk_size=None, refresh=False):
+    # Как extract_counters_cached: из logs читаются только дни, которых нет в store,
+    # и дни, в которых появились строки с id больше сохранённого watermark.
+    # refresh пересчитывает весь период
+    days = [day.date() for day in pd.date_range(start_date, end_date)]
+    stored, watermarks = store.load(start_date, end_date)
+    if refresh:
+        watermarks = {}
+    stale_days = set()
+    if watermarks:
+        for day, max_id in source.stale_days(min(watermarks.values()), start_date, end_date):
+            if day in watermarks and max_id > watermarks[day]:
+                stale_days.add(day)
+    missing_days = [day for day in days if day not in watermarks or day in stale_days]
+    if missing_days:
+        watermark = source.max_log_id()
+    for range_start, range_end in group_days(missing_days):
+        sketches = read_sketches(source, range_start, range_end, store.precision, chunk_size)
+        range_days = [day for day in missing_days if range_start <= day.isoformat() <= range_end]
+        store.store(range_days, sketches, watermark)
+    return store.load(start_date, end_date)[0]
+
+
+def read_session_stats(
+        source,
+        start_date,
+        end_date,
+        timeout_minutes=DEFAULT_TIMEOUT_MINUTES,
+        chunk_size=None,
+        partitions=DEFAULT_PARTITIONS,
+        profiler=None):
+    # Дневная статистика сессий. Без chunk_size период сессионизируется целиком в памяти.
+    # С chunk_size порции раскладываются на диск по партициям хэша cookie, затем партиции
+    # сессионизируются по очереди. Сессии, которые начались до start_date или закончились
+    # после end_date, обрезаются границами периода
+    timeout = timeout_minutes * 60
+    if not chunk_size:
+        with profile_stage(profiler, 'sessions_extract'):
+            logs = source.read_logs(start_date, end_date, SESSION_COLUMNS)
+            profile_frame(profiler, logs)
+        with profile_stage(profiler, 'sessions'):
+            return session_stats(*sessionize(*session_events(logs), timeout))
+    spill = SessionPartitions(partitions)
+    try:
+        chunks = profile_chunks(
+            profiler,
+            'sessions_extract',
+            source.read_logs_chunks(start_date, end_date, chunk_size, SESSION_COLUMNS))
+        with profile_stage(profiler, 'sessions_spill'):
+            for chunk in chunks:
+                spill.add(*session_events(chunk))
+        stats = None
+        with profile_stage(profiler, 'sessions'):
+            for events in spill:
+                stats = merge_session_stats(stats, session_stats(*sessionize(*events, timeout)))
     finally:
-        if 'conn' in locals():
-            conn.close()
+        spill.close()
+    return empty_session_stats() if stats is None else stats
 
 
 def transform_data(data):
-    data['day'] = data['time'].dt.date
-    unique_days = data['day'].unique()
-    final_data = pd.DataFrame()
-    registrations = data[data['activity_type'] == 2].groupby('day')['user_id'].count()
-    final_data['number_of_new_users'] = registrations
-    anonymous_comments = data[(data['activity_type'] == 8) & (data['user_id'].isnull())].groupby('day')['id'].count()
-    all_comments = data[data['activity_type'] == 8].groupby('day')['id'].count()
-    final_data['anonymous_comments_ratio'] = round(anonymous_comments / all_comments, 2)
+    return build_report(fold_counters(data))
+
+
+def accumulate_topics(counters, topic_base=None):
+    # Накопленное число топиков по дням; topic_base - значение на день раньше первого дня counters
+    topic_count = counters['created_topics'] - counters['deleted_topics']
+    return topic_count.cumsum() + (topic_base or 0)
+
+
+def build_report(counters, topic_base=None):
+    # Строка отчёта на каждый день, в котором есть логи. Дата берётся из индекса,
+    # а не позиционно, поэтому день без регистраций не сдвигает даты остальных строк.
+    # Без topic_base изменение числа топиков за первый день не определено
+    counters = counters.sort_index()
+    final_data = pd.DataFrame(index=counters.index)
+    final_data['date'] = counters.index
+    final_data['number_of_new_users'] = counters['registrations']
+    all_comments = counters['comments']
+    final_data['anonymous_comments_ratio'] = round(
+        counters['anonymous_comments'] / all_comments.where(all_comments > 0), 2)
     final_data['comments_count'] = all_comments
-    topic_count = data[(data['activity_type'] == 5) & (data['server_response'] != 401)].groupby('day')['id'].count() - data[data['activity_type'] == 7].groupby('day')['id'].count()
-    accumulated_topic_count = topic_count.cumsum()
-    topic_count_change = round(accumulated_topic_count.pct_change() * 100, 2)
+    accumulated_topic_count = accumulate_topics(counters, topic_base)
+    previous_topic_count = accumulated_topic_count.shift(1, fill_value=topic_base)
+    topic_count_change = round((accumulated_topic_count / previous_topic_count - 1) * 100, 2)
     final_data['topic_count_change'] = topic_count_change
-    final_data['date'] = unique_days
     return final_data[['date',
                        'number_of_new_users',
                        'anonymous_comments_ratio',
@@ -59,36 +334,384 @@ def save_data_to_csv(data, filename):
     data.to_csv(filename, index=False)
 
 
+def save_report(counters, start_date, output, output_format, since=None, profiler=None):
+    # Строит отчёт по дневным счётчикам и записывает его в output.
+    # Для partitioned возвращает список переписанных месяцев; since - первый изменившийся
+    # день, строки раньше него не переписываются
+    if output_format == 'partitioned':
+        # Отчёт продолжает накопленное число топиков с последнего записанного раньше дня
+        report = PartitionedReport(output)
+        with profile_stage(profiler, 'report'):
+            topic_base = report.topic_base(start_date)
+            data = build_report(counters, topic_base)
+            topic_counts = accumulate_topics(counters.sort_index(), topic_base)
+            if since is not None:
+                changed = (data['date'] >= since).to_numpy()
+                data, topic_counts = data[changed], topic_counts[changed]
+            profile_frame(profiler, data)
+        with profile_stage(profiler, 'save'):
+            return report.write(data, topic_counts)
+    with profile_stage(profiler, 'report'):
+        data = build_report(counters)
+        profile_frame(profiler, data)
+    with profile_stage(profiler, 'save'):
+        if output_format == 'parquet':
+            save_data_to_parquet(data, output)
+        elif output_format == 'arrow':
+            save_data_to_arrow(data, output)
+        else:
+            save_data_to_csv(data, output)
+        if profiler is not None:
+            profiler.add(len(data), os.path.getsize(output))
+    return None
+
+
+def follow(source, start_date, cache, on_update, interval, batch_size, listener=None):
+    # Режим --follow: читаются только строки с logs.id больше watermark, их счётчики
+    # добавляются к счётчикам дней в памяти. Стоимость обновления зависит от числа новых
+    # строк, а не от истории: build_report пересчитывает накопленную сумму по дням.
+    # Счётчики и watermark хранятся в cache, поэтому после перезапуска чтение
+    # продолжается с последней обработанной строки. Строки за дни раньше start_date
+    # только сдвигают watermark. Предполагается, что строки logs становятся видны
+    # в порядке id (один пишущий процесс); иначе пропущенные дни пересчитает
+    # обычный запуск с кэшем
+    start = pd.Timestamp(start_date)
+    cached = cache.load(start_date, date.max.isoformat())
+    counters = cached.loc[cached['has_logs'] == 1, COUNTER_COLUMNS].astype('int64')
+    watermark = int(cache.get_state('watermark', 0))
+    on_update(counters, None, watermark, 0)
+    since = None
+    new_rows = 0
+    while True:
+        batch = source.read_logs_after(watermark, batch_size, FOLLOW_COLUMNS)
+        # Полная порция - признак, что строки ещё есть; считается до отбора по start_date
+        full_batch = len(batch) == batch_size
+        if not batch.empty:
+            watermark = int(batch['id'].max())
+            batch = batch[batch['time'] >= start]
+            partial = aggregate_logs(batch)
+            counters = merge_counters(counters, partial)
+            cache.update(counters.loc[partial.index], watermark)
+            if not partial.empty:
+                since = min(since or date.max, min(partial.index))
+            new_rows += len(batch)
+        if full_batch:
+            # Накопившиеся строки дочитываются без записи отчёта после каждой порции
+            continue
+        if since is not None:
+            on_update(counters, since, watermark, new_rows)
+            since = None
+            new_rows = 0
+        if listener is not None:
+            listener.wait(interval)
+        else:
+            time.sleep(interval)
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Извлечение и анализ данных из базы форума')
     parser.add_argument('--start_date', type=str, default='2025-01-01', 
                        help='Дата начала периода в формате YYYY-MM-DD')
     parser.add_argument('--end_date', type=str, default='2025-01-10', 
                        help='Дата окончания периода в формате YYYY-MM-DD')
-    parser.add_argument('--output', type=str, default='data.csv',
-                       help='Имя выходного файла')
+    parser.add_argument('--output', type=str, default=None,
+                       help='Выходной файл или каталог (по умолчанию data.csv, data.parquet, data.arrow или report)')
+    parser.add_argument('--output_format', choices=REPORT_FORMATS, default='csv',
+                       help='Формат отчёта: csv, parquet, arrow (Arrow IPC) или partitioned '
+                            '(каталог Parquet по месяцам с заменой строк по дате)')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--chunk_size', type=int, default=None,
+                       help='Читать логи порциями указанного размера (для PostgreSQL - через серверный курсор)')
+    mode.add_argument('--pushdown', action='store_true',
+                       help='Считать дневные счётчики в БД вместо выгрузки всех строк')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Число процессов, между которыми делится период')
+    parser.add_argument('--shard_days', type=int, default=7,
+                       help='Длина отрезка периода в днях для одного процесса (1 - по дням, 7 - по неделям)')
+    parser.add_argument('--cache', type=str, default=None,
+                       help='Файл кэша дневных счётчиков (по умолчанию metrics_cache_<источник>.sqlite)')
+    parser.add_argument('--no_cache', action='store_true',
+                       help='Не использовать кэш и пересчитать весь период')
+    parser.add_argument('--source', choices=['postgres', 'sqlite', 'parquet'], default='postgres',
+                       help='Источник логов')
+    parser.add_argument('--source_path', type=str, default=None,
+                       help='Файл SQLite или каталог Parquet для --source sqlite/parquet')
+    parser.add_argument('--host', type=str, default=os.environ.get('PGHOST', 'localhost'),
+                       help='Хост PostgreSQL (по умолчанию PGHOST или localhost)')
+    parser.add_argument('--user', type=str, default=os.environ.get('PGUSER', 'postgres'),
+                       help='Пользователь PostgreSQL (по умолчанию PGUSER или postgres)')
+    parser.add_argument('--password', type=str, default=os.environ.get('PGPASSWORD', 'postgres'),
+                       help='Пароль PostgreSQL (по умолчанию PGPASSWORD или postgres)')
+    parser.add_argument('--dbname', type=str, default=os.environ.get('PGDATABASE', 'forum'),
+                       help='База PostgreSQL (по умолчанию PGDATABASE или forum)')
+    parser.add_argument('--profile', type=str, nargs='?', const='-', default=None,
+                       help='Записать метрики этапов в JSON-файл (без имени файла - вывести в stdout)')
+    parser.add_argument('--explain', action='store_true',
+                       help='Добавить в --profile план запроса выборки (PostgreSQL: EXPLAIN (ANALYZE, BUFFERS))')
+    parser.add_argument('--cprofile', type=str, default=None,
+                       help='Запустить под cProfile и сохранить статистику pstats в файл')
+    parser.add_argument('--follow', action='store_true',
+                       help='Не завершаться: дочитывать новые строки logs по watermark id и обновлять отчёт')
+    parser.add_argument('--interval', type=float, default=5,
+                       help='Интервал опроса logs в секундах для --follow')
+    parser.add_argument('--batch_size', type=int, default=100000,
+                       help='Сколько новых строк читать за один запрос в --follow')
+    parser.add_argument('--notify', action='store_true',
+                       help='Ждать NOTIFY о новых строках (migrations/002_logs_notify.sql) вместо опроса по интервалу')
+    parser.add_argument('--uniques', type=str, default=None,
+                       help='CSV-файл с оценками уникальных пользователей, посетителей и комментаторов '
+                            'за день и за 7 и 30 дней (HyperLogLog)')
+    parser.add_argument('--hll_precision', type=int, default=DEFAULT_PRECISION,
+                       help='Точность HyperLogLog: 2^p регистров, ошибка около 1.04/sqrt(2^p)')
+    parser.add_argument('--sketch_store', type=str, default=None,
+                       help='Файл дневных скетчей (по умолчанию sketches_<источник>.sqlite)')
+    parser.add_argument('--sessions', type=str, default=None,
+                       help='CSV-файл со статистикой сессий по дням (сессии по cookie)')
+    parser.add_argument('--session_timeout', type=float, default=DEFAULT_TIMEOUT_MINUTES,
+                       help='Перерыв в минутах, после которого начинается новая сессия')
+    parser.add_argument('--session_partitions', type=int, default=DEFAULT_PARTITIONS,
+                       help='Число партиций по хэшу cookie для сессий при --chunk_size')
+    parser.add_argument('--threads', type=str, default=None,
+                       help='CSV-файл с метриками веток комментариев по топикам (по всей таблице comments)')
+    parser.add_argument('--engine', choices=ENGINES, default='pandas',
+                       help='Чем считать дневные счётчики: pandas или DuckDB (потоково, без загрузки строк в память)')
+    parser.add_argument('--memory_limit', type=str, default=None,
+                       help='Лимит памяти DuckDB, например 2GB (по умолчанию 80%% памяти системы)')
+    parser.add_argument('--engine_threads', type=int, default=None,
+                       help='Число потоков DuckDB (по умолчанию по числу ядер)')
+    parser.add_argument('--spill_directory', type=str, default=None,
+                       help='Каталог для данных, которые DuckDB сбрасывает на диск при нехватке памяти')
     args = parser.parse_args()
+    if args.output is None:
+        args.output = DEFAULT_OUTPUTS[args.output_format]
+    if args.source != 'postgres' and not args.source_path:
+        parser.error(f'Для --source {args.source} нужен --source_path')
+    if args.pushdown and args.source == 'parquet':
+        parser.error('--pushdown работает только с SQL-источниками (postgres, sqlite)')
+    if args.chunk_size is not None and args.chunk_size <= 0:
+        parser.error('--chunk_size должен быть положительным числом')
+    if args.workers <= 0 or args.shard_days <= 0:
+        parser.error('--workers и --shard_days должны быть положительными числами')
+    if args.pushdown and args.workers > 1:
+        parser.error('--pushdown не используется вместе с --workers')
+    if args.follow and (args.no_cache or args.pushdown or args.workers > 1 or args.chunk_size
+                        or args.profile or args.cprofile):
+        parser.error('--follow не используется вместе с --no_cache, --pushdown, --workers, '
+                     '--chunk_size, --profile и --cprofile')
+    if args.notify and (not args.follow or args.source != 'postgres'):
+        parser.error('--notify работает только с --follow и --source postgres')
+    if not 4 <= args.hll_precision <= 18:
+        parser.error('--hll_precision должна быть от 4 до 18')
+    if args.uniques and args.follow:
+        parser.error('--uniques не используется вместе с --follow')
+    if (args.sessions or args.threads) and args.follow:
+        parser.error('--sessions и --threads не используются вместе с --follow')
+    if args.session_timeout <= 0 or args.session_partitions <= 0:
+        parser.error('--session_timeout и --session_partitions должны быть положительными числами')
+    if args.interval <= 0 or args.batch_size <= 0:
+        parser.error('--interval и --batch_size должны быть положительными числами')
+    if args.engine == 'duckdb' and (args.pushdown or args.chunk_size or args.workers > 1 or args.follow):
+        parser.error('--engine duckdb не используется вместе с --pushdown, --chunk_size, --workers и --follow')
+    if args.engine == 'pandas' and (args.memory_limit or args.engine_threads or args.spill_directory):
+        parser.error('--memory_limit, --engine_threads и --spill_directory работают только с --engine duckdb')
+    if args.engine_threads is not None and args.engine_threads <= 0:
+        parser.error('--engine_threads должен быть положительным числом')
+    if args.explain and (args.profile is None or args.source == 'parquet' and args.engine == 'pandas'):
+        parser.error('--explain работает только вместе с --profile, с SQL-источниками (postgres, sqlite) '
+                     'или с --engine duckdb')
 
     try:
         # Проверка корректности формата дат
         start_date = datetime.strptime(args.start_date, '%Y-%m-%d')
         end_date = datetime.strptime(args.end_date, '%Y-%m-%d')
         
-        if end_date < start_date:
+        # --follow не использует --end_date
+        if end_date < start_date and not args.follow:
             raise ValueError("Дата окончания не может быть раньше даты начала")
 
-        data = extract_logs(
-            'localhost',
-            'postgres',
-            'postgres',
-            'forum',
-            args.start_date,
-            args.end_date)
-        
-        data = transform_data(data)
-        save_data_to_csv(data, args.output)
-        print(f"Данные успешно сохранены в файл {args.output}")
-        print(f"Период: с {args.start_date} по {args.end_date}")
+        if args.source == 'sqlite':
+            source = SQLiteSource(args.source_path)
+        elif args.source == 'parquet':
+            source = ParquetSource(args.source_path)
+        else:
+            source = PostgresSource(args.host, args.user, args.password, args.dbname)
+
+        if args.follow:
+            # Состояние --follow хранится отдельно от кэша обычных запусков
+            cache = MetricsCache(args.cache or f'follow_state_{args.source}.sqlite', COUNTER_COLUMNS)
+            if cache.bind(source.fingerprint(), source.max_log_id()):
+                print("Состояние --follow относилось к другому источнику или к пересозданной базе и сброшено")
+            state_start_date = cache.get_state('start_date')
+            if state_start_date is None:
+                cache.set_state('start_date', args.start_date)
+            elif state_start_date != args.start_date:
+                cache.close()
+                parser.error(f'Состояние --follow в кэше начинается с {state_start_date}: '
+                             f'укажите эту --start_date или другой --cache')
+            listener = LogsListener(source) if args.notify else None
+
+            def on_update(counters, since, watermark, new_rows):
+                save_report(counters, args.start_date, args.output, args.output_format, since)
+                print(f"{datetime.now():%Y-%m-%d %H:%M:%S} watermark {watermark}, "
+                      f"новых строк {new_rows}, отчёт записан в {args.output}", flush=True)
+
+            try:
+                follow(source, args.start_date, cache, on_update, args.interval, args.batch_size, listener)
+            except KeyboardInterrupt:
+                print(f"Остановлено, watermark {cache.get_state('watermark', 0)} сохранён")
+            finally:
+                cache.close()
+                if listener is not None:
+                    listener.close()
+        else:
+            # Этапы --profile: extract (запрос и передача строк), aggregate (свёртка в дневные
+            # счётчики), workers, cache, report (build_report) и save (запись отчёта);
+            # с --sessions - sessions_extract, sessions_spill (раскладка по партициям) и sessions,
+            # с --threads - threads_extract и threads
+            profiler = StageProfiler() if args.profile else None
+            if args.cprofile:
+                cprofile = cProfile.Profile()
+                cprofile.enable()
+            started = time.perf_counter()
+            cpu_started = time.process_time()
+
+            engine = None
+            if args.engine == 'duckdb':
+                engine = DuckDBEngine(source, args.memory_limit, args.engine_threads, args.spill_directory)
+
+            def compute_counters(range_start, range_end):
+                if engine is not None:
+                    with profile_stage(profiler, 'extract'):
+                        counters = engine.daily_counters(range_start, range_end)
+                        profile_frame(profiler, counters)
+                    return counters
+                if args.pushdown:
+                    with profile_stage(profiler, 'extract'):
+                        counters = source.daily_counters(range_start, range_end)
+                        profile_frame(profiler, counters)
+                    return counters
+                if args.workers > 1:
+                    return extract_counters_parallel(
+                        source,
+                        range_start,
+                        range_end,
+                        args.workers,
+                        args.shard_days,
+                        args.chunk_size,
+                        profiler)
+                return read_counters(source, range_start, range_end, args.chunk_size, profiler)
+
+            if args.no_cache:
+                counters = compute_counters(args.start_date, args.end_date)
+            else:
+                # У каждого типа источника свой файл кэша, а bind сбрасывает кэш, заполненный
+                # из другой базы или файла, чтобы счётчики разных данных не смешивались
+                cache = MetricsCache(args.cache or f'metrics_cache_{args.source}.sqlite', COUNTER_COLUMNS)
+                try:
+                    if cache.bind(source.fingerprint(), source.max_log_id()):
+                        print("Кэш относился к другому источнику или к пересозданной базе и очищен")
+                    with profile_stage(profiler, 'cache'):
+                        counters = extract_counters_cached(
+                            source,
+                            args.start_date,
+                            args.end_date,
+                            cache,
+                            compute_counters)
+                    print(f"Кэш: дней из кэша {cache.hits}, пересчитано {cache.misses} "
+                          f"(из них устаревших {cache.stale})")
+                finally:
+                    cache.close()
+            months = save_report(counters, args.start_date, args.output, args.output_format, profiler=profiler)
+            if months is not None:
+                print(f"Обновлены месяцы {', '.join(months) or '-'} в каталоге {args.output}")
+            else:
+                print(f"Данные успешно сохранены в файл {args.output}")
+            print(f"Период: с {args.start_date} по {args.end_date}")
+
+            if args.uniques:
+                store = SketchStore(args.sketch_store or f'sketches_{args.source}.sqlite', args.hll_precision)
+                try:
+                    if store.bind(source.fingerprint(), source.max_log_id()):
+                        print("Скетчи относились к другому источнику или к пересозданной базе и удалены")
+                    # Окна _7d и _30d на первые дни периода включают дни до --start_date
+                    sketches = extract_sketches_cached(
+                        source,
+                        history_start(args.start_date),
+                        args.end_date,
+                        store,
+                        args.chunk_size,
+                        refresh=args.no_cache)
+                finally:
+                    store.close()
+                save_data_to_csv(uniques_report(sketches, args.start_date), args.uniques)
+                totals = range_uniques(sketches, args.start_date)
+                totals = ', '.join(f"{metric} {value}" for metric, value in totals.items())
+                print(f"Уникальные сохранены в файл {args.uniques}, за период: {totals}")
+
+            if args.sessions:
+                stats = read_session_stats(
+                    source,
+                    args.start_date,
+                    args.end_date,
+                    args.session_timeout,
+                    args.chunk_size,
+                    args.session_partitions,
+                    profiler)
+                save_data_to_csv(sessions_report(stats), args.sessions)
+                print(f"Статистика сессий сохранена в файл {args.sessions}, "
+                      f"сессий за период: {stats['sessions'].sum()}")
+
+            if args.threads:
+                with profile_stage(profiler, 'threads_extract'):
+                    comments = source.read_comments()
+                    comment_logs = source.read_comment_logs()
+                    profile_frame(profiler, comments)
+                with profile_stage(profiler, 'threads'):
+                    threads = thread_stats(comments, comment_logs)
+                save_data_to_csv(threads, args.threads)
+                print(f"Метрики веток комментариев сохранены в файл {args.threads}, "
+                      f"топиков: {len(threads)}")
+
+            if args.cprofile:
+                cprofile.disable()
+                cprofile.dump_stats(args.cprofile)
+            if profiler is not None:
+                stages = profiler.report()
+                metrics = {
+                    'run': {
+                        'start_date': args.start_date,
+                        'end_date': args.end_date,
+                        'source': args.source,
+                        'mode': 'pushdown' if args.pushdown else 'chunks' if args.chunk_size else 'frame',
+                        'engine': args.engine,
+                        'chunk_size': args.chunk_size,
+                        'workers': args.workers,
+                        'cache': not args.no_cache,
+                        'output_format': args.output_format
+                    },
+                    'total': {
+                        'wall_seconds': round(time.perf_counter() - started, 6),
+                        'cpu_seconds': round(time.process_time() - cpu_started, 6),
+                        'peak_rss_mb': max((stats['peak_rss_mb'] for stats in stages.values()), default=None)
+                    },
+                    'stages': stages
+                }
+                if args.explain and engine is not None:
+                    metrics['explain'] = engine.explain(args.start_date, args.end_date)
+                elif args.explain:
+                    metrics['explain'] = source.explain(
+                        args.start_date,
+                        args.end_date,
+                        REPORT_COLUMNS,
+                        args.pushdown)
+                if args.cprofile:
+                    metrics['cprofile'] = cprofile_top(cprofile)
+                if args.profile == '-':
+                    print(json.dumps(metrics, indent=2, ensure_ascii=False))
+                else:
+                    with open(args.profile, 'w') as file:
+                        json.dump(metrics, file, indent=2, ensure_ascii=False)
+                    print(f"Метрики этапов сохранены в файл {args.profile}")
         
     except ValueError as e:
         print(f"Ошибка в формате дат: {e}")
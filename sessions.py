@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+SESSION_COLUMNS = ['time', 'activity_type', 'cookie']
+LOGOUT = 4
+DEFAULT_TIMEOUT_MINUTES = 30
+DEFAULT_PARTITIONS = 16
+# Корзины распределений: длина сессии в секундах и число действий за сессию.
+# Граница - начало следующей корзины, последняя корзина открыта справа
+LENGTH_BINS = [60, 300, 900, 1800, 3600]
+LENGTH_COLUMNS = ['length_under_1m', 'length_1_5m', 'length_5_15m', 'length_15_30m', 'length_30_60m',
+                  'length_over_60m']
+ACTIONS_BINS = [2, 3, 6, 11, 21]
+ACTIONS_COLUMNS = ['actions_1', 'actions_2', 'actions_3_5', 'actions_6_10', 'actions_11_20', 'actions_over_20']
+SESSION_STATS_COLUMNS = ['sessions', 'session_seconds', 'actions'] + LENGTH_COLUMNS + ACTIONS_COLUMNS
+NANOSECONDS = 10 ** 9
+DAY_NANOSECONDS = 86400 * NANOSECONDS
+
+
+def session_events(data):
+    # Порция logs -> массивы (время в наносекундах, хэш cookie, тип события).
+    # Строки без cookie к сессиям не относятся. Вместо строки cookie хранится 64-битный хэш:
+    # 8 байт на строку, вероятность совпадения хэшей разных cookie пренебрежимо мала
+    data = data[data['cookie'].notna()]
+    time = data['time'].to_numpy().astype('datetime64[ns]').astype(np.int64)
+    key = pd.util.hash_array(data['cookie'].to_numpy(dtype=object))
+    activity_type = data['activity_type'].to_numpy().astype(np.int8)
+    return time, key, activity_type
+
+
+def sessionize(time, key, activity_type, timeout_seconds=DEFAULT_TIMEOUT_MINUTES * 60):
+    # События одного cookie, отсортированные по времени, делятся на сессии: новая сессия
+    # начинается, если перерыв больше timeout_seconds или предыдущее событие - logout.
+    # Возвращает (начало сессии в наносекундах, длительность в секундах, число действий).
+    # Все cookie должны быть целиком в переданных массивах
+    if not len(time):
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty
+    order = np.lexsort((time, key))
+    time, key, activity_type = time[order], key[order], activity_type[order]
+    boundary = np.empty(len(time), dtype=bool)
+    boundary[0] = True
+    boundary[1:] = ((key[1:] != key[:-1])
+                    | (time[1:] - time[:-1] > timeout_seconds * NANOSECONDS)
+                    | (activity_type[:-1] == LOGOUT))
+    starts = np.flatnonzero(boundary)
+    ends = np.append(starts[1:], len(time))
+    duration = (time[ends - 1] - time[starts]) // NANOSECONDS
+    return time[starts], duration, ends - starts
+
+
+def session_stats(start, duration, actions):
+    # Дневные счётчики по сессиям: сессия относится ко дню своего начала. Счётчики
+    # складываются (merge_session_stats), поэтому партиции считаются независимо
+    if not len(start):
+        return empty_session_stats()
+    day = start // DAY_NANOSECONDS
+    first_day = day.min()
+    day = day - first_day
+    days_count = day.max() + 1
+    columns = {
+        'sessions': np.bincount(day, minlength=days_count),
+        'session_seconds': np.bincount(day, weights=duration, minlength=days_count).astype(np.int64),
+        'actions': np.bincount(day, weights=actions, minlength=days_count).astype(np.int64)
+    }
+    for values, bins, names in ((duration, LENGTH_BINS, LENGTH_COLUMNS), (actions, ACTIONS_BINS, ACTIONS_COLUMNS)):
+        bucket = np.digitize(values, bins)
+        counts = np.bincount(day * len(names) + bucket, minlength=days_count * len(names))
+        for name, column in zip(names, counts.reshape(days_count, len(names)).T):
+            columns[name] = column
+    stats = pd.DataFrame(columns)
+    stats.index = pd.Index((np.arange(days_count) + first_day).astype('datetime64[D]').tolist(), name='day')
+    stats = stats[stats['sessions'] > 0]
+    return stats[SESSION_STATS_COLUMNS].astype('int64')
+
+
+def empty_session_stats():
+    return pd.DataFrame(columns=SESSION_STATS_COLUMNS, index=pd.Index([], name='day'), dtype='int64')
+
+
+def merge_session_stats(stats, partial):
+    if stats is None:
+        return partial
+    return stats.add(partial, fill_value=0).astype('int64')
+
+
+def sessions_report(stats):
+    # Отчёт по дням: число сессий, средние длительность и число действий, распределения
+    # длины сессии и числа действий по корзинам
+    stats = stats.sort_index()
+    report = pd.DataFrame({'date': stats.index}, index=stats.index)
+    report['sessions'] = stats['sessions']
+    report['avg_session_minutes'] = round(stats['session_seconds'] / stats['sessions'] / 60, 2)
+    report['avg_actions_per_session'] = round(stats['actions'] / stats['sessions'], 2)
+    return pd.concat([report, stats[LENGTH_COLUMNS + ACTIONS_COLUMNS]], axis=1)
+
+
+class SessionPartitions:
+    # Раскладка событий по партициям хэша cookie во временном каталоге: все события
+    # одного cookie попадают в одну партицию, поэтому партиции сессионизируются
+    # по отдельности, и в памяти одновременно находится одна партиция, а не весь период.
+    # Каждая колонка партиции - файл с сырыми массивами numpy, порции дописываются в конец
+    columns = (('time', np.int64), ('key', np.uint64), ('activity_type', np.int8))
+
+    def __init__(self, partitions=DEFAULT_PARTITIONS, directory=None):
+        self.partitions = partitions
+        self.directory = tempfile.mkdtemp(prefix='sessions_', dir=directory)
+        self.rows = np.zeros(partitions, dtype=np.int64)
+
+    def path(self, partition, column):
+        return os.path.join(self.directory, f'{partition}.{column}')
+
+    def add(self, time, key, activity_type):
+        partition = (key % np.uint64(self.partitions)).astype(np.intp)
+        order = np.argsort(partition, kind='stable')
+        counts = np.bincount(partition, minlength=self.partitions)
+        bounds = np.append(0, np.cumsum(counts))
+        for (column, _), values in zip(self.columns, (time, key, activity_type)):
+            values = values[order]
+            for number in np.flatnonzero(counts):
+                with open(self.path(number, column), 'ab') as file:
+                    values[bounds[number]:bounds[number + 1]].tofile(file)
+        self.rows += counts
+
+    def __iter__(self):
+        for number in np.flatnonzero(self.rows):
+            yield tuple(np.fromfile(self.path(number, column), dtype=dtype) for column, dtype in self.columns)
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,253 @@
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+# Уникальные за день: пользователи (DAU), посетители по cookie и авторы комментариев
+# (зарегистрированные - по user_id, анонимные - по cookie)
+UNIQUE_METRICS = ['dau', 'unique_visitors', 'unique_commenters']
+SKETCH_COLUMNS = ['time', 'user_id', 'activity_type', 'cookie']
+DEFAULT_PRECISION = 14
+ROLLING_WINDOWS = (7, 30)
+
+
+def bit_length(values):
+    # Число значащих бит uint64. frexp точен для чисел до 2^53, поэтому значение
+    # делится на старшие и младшие 32 бита
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1])
+
+
+def sigma(x):
+    y = 1.0
+    z = x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def tau(x):
+    if x == 0 or x == 1:
+        return 0.0
+    y = 1.0
+    z = 1 - x
+    while True:
+        x = np.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+class HyperLogLog:
+    # Оценка числа уникальных значений с фиксированной памятью: 2^precision однобайтовых
+    # регистров, стандартная ошибка около 1.04 / sqrt(2^precision) (0.8% при precision 14).
+    # Скетчи с одинаковой precision объединяются поэлементным максимумом регистров
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision HyperLogLog должна быть от 4 до 18")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8) if registers is None else registers
+
+    @staticmethod
+    def positions(hashes, precision):
+        # Номер регистра - старшие precision бит хэша, значение - позиция первой единицы
+        # в остальных битах
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - precision)).astype(np.intp)
+        rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+        rank = (64 - precision + 1 - bit_length(rest)).astype(np.uint8)
+        return index, rank
+
+    def add_hashes(self, hashes):
+        index, rank = self.positions(hashes, self.precision)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Объединять можно только скетчи с одинаковой precision")
+        return HyperLogLog(self.precision, np.maximum(self.registers, other.registers))
+
+    def estimate(self):
+        # Улучшенная оценка Эртла (O. Ertl, New cardinality estimation algorithms for
+        # HyperLogLog sketches, 2017): по гистограмме значений регистров, без смещения
+        # классической формулы при числе значений порядка 2.5-5 * 2^precision
+        m = len(self.registers)
+        q = 64 - self.precision
+        counts = np.bincount(self.registers, minlength=q + 2).astype(np.float64)
+        if counts[0] == m:
+            return 0.0
+        z = m * tau(1 - counts[q + 1] / m)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + counts[k])
+        z += m * sigma(counts[0] / m)
+        return m * m / (2 * np.log(2) * z)
+
+    def to_bytes(self):
+        return self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, precision):
+        return cls(precision, np.frombuffer(data, dtype=np.uint8).copy())
+
+
+def unique_keys(data):
+    # Хэши (uint64) и маски строк для каждой метрики из UNIQUE_METRICS
+    user_id = data['user_id']
+    named = user_id.notna().to_numpy()
+    user_hash = pd.util.hash_array(user_id.to_numpy(dtype='int64', na_value=0))
+    cookie = data['cookie']
+    has_cookie = cookie.notna().to_numpy()
+    cookie_hash = pd.util.hash_array(cookie.to_numpy(dtype=object, na_value=''))
+    comment = data['activity_type'].to_numpy() == 8
+    return {
+        'dau': (user_hash, named),
+        'unique_visitors': (cookie_hash, has_cookie),
+        'unique_commenters': (np.where(named, user_hash, cookie_hash), comment & (named | has_cookie))
+    }
+
+
+def daily_sketches(data, precision=DEFAULT_PRECISION):
+    # Скетчи по дням: DataFrame с индексом day и колонками UNIQUE_METRICS из HyperLogLog.
+    # Регистры всех дней заполняются одним np.maximum.at по паре (день, регистр)
+    if data.empty:
+        return empty_sketches()
+    day = data['time'].to_numpy().astype('datetime64[D]')
+    day_codes, days = pd.factorize(day, sort=True)
+    columns = {}
+    for metric, (hashes, mask) in unique_keys(data).items():
+        registers = np.zeros((len(days), 1 << precision), dtype=np.uint8)
+        index, rank = HyperLogLog.positions(hashes[mask], precision)
+        np.maximum.at(registers, (day_codes[mask], index), rank)
+        columns[metric] = [HyperLogLog(precision, day_registers) for day_registers in registers]
+    return pd.DataFrame(columns, index=pd.Index(pd.to_datetime(days).date, name='day'))
+
+
+def empty_sketches():
+    return pd.DataFrame(columns=UNIQUE_METRICS, index=pd.Index([], name='day'), dtype=object)
+
+
+def merge_sketches(sketches, partial):
+    # Объединение скетчей порций или отрезков периода: общие дни сливаются по регистрам
+    if sketches is None:
+        return partial
+    merged = pd.concat([sketches, partial])
+    return merged.groupby(level='day').agg(lambda column: merge_all(column.tolist()))
+
+
+def merge_all(sketches):
+    result = sketches[0]
+    for sketch in sketches[1:]:
+        result = result.merge(sketch)
+    return result
+
+
+def history_start(start_date, windows=ROLLING_WINDOWS):
+    # Первый день, скетчи с которого нужны для полных окон на start_date
+    return (date.fromisoformat(start_date) - timedelta(days=max(windows) - 1)).isoformat()
+
+
+def uniques_report(sketches, start_date=None, windows=ROLLING_WINDOWS):
+    # Оценки уникальных за день и за скользящие окна из windows календарных дней
+    # (дни без логов в окне просто пропускаются) без повторного чтения логов.
+    # Скетчи раньше start_date (с history_start) участвуют только в окнах, строк для них нет
+    sketches = sketches.sort_index()
+    report = pd.DataFrame({'date': sketches.index}, index=sketches.index)
+    ordinals = np.array([day.toordinal() for day in sketches.index], dtype=np.int64)
+    for metric in UNIQUE_METRICS:
+        registers = np.stack([sketch.registers for sketch in sketches[metric]]) if len(sketches) else None
+        report[metric] = [round(sketch.estimate()) for sketch in sketches[metric]]
+        for window in windows:
+            estimates = []
+            for position, ordinal in enumerate(ordinals):
+                first = np.searchsorted(ordinals, ordinal - window + 1)
+                merged = registers[first:position + 1].max(axis=0)
+                estimates.append(round(HyperLogLog(sketches[metric].iloc[0].precision, merged).estimate()))
+            report[f'{metric}_{window}d'] = estimates
+    if start_date is not None:
+        report = report[report['date'] >= date.fromisoformat(start_date)]
+    return report
+
+
+def range_uniques(sketches, start_date=None):
+    # Уникальные за период с start_date (или за все дни sketches): объединение дневных скетчей
+    if start_date is not None:
+        sketches = sketches[sketches.index >= date.fromisoformat(start_date)]
+    if sketches.empty:
+        return {metric: 0 for metric in UNIQUE_METRICS}
+    return {metric: round(merge_all(sketches[metric].tolist()).estimate()) for metric in UNIQUE_METRICS}
+
+
+class SketchStore:
+    # Дневные скетчи в SQLite рядом с отчётом: диапазоны (неделя, месяц, любой период)
+    # считаются объединением сохранённых скетчей без чтения logs. Как и в MetricsCache,
+    # для дня хранится watermark - максимальный logs.id на момент расчёта, а пустые дни
+    # хранятся без регистров, чтобы не пересчитывать их. Источник скетчей проверяется
+    # так же, как в MetricsCache.bind
+    def __init__(self, path, precision=DEFAULT_PRECISION):
+        self.precision = precision
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS daily_sketches (
+                day TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                precision INTEGER NOT NULL,
+                watermark INTEGER NOT NULL,
+                registers BLOB,
+                PRIMARY KEY (day, metric)
+            )
+        """)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.commit()
+
+    def bind(self, fingerprint, max_log_id):
+        rows, watermark = self.conn.execute("SELECT COUNT(*), MAX(watermark) FROM daily_sketches").fetchone()
+        stored = self.conn.execute("SELECT value FROM state WHERE key = 'source'").fetchone()
+        cleared = False
+        if stored is None or stored[0] != fingerprint or (watermark or 0) > max_log_id:
+            cleared = rows > 0
+            self.conn.execute("DELETE FROM daily_sketches")
+        self.conn.execute("INSERT OR REPLACE INTO state VALUES ('source', ?)", (fingerprint,))
+        self.conn.commit()
+        return cleared
+
+    def load(self, start_date, end_date):
+        # Дни периода со скетчами нужной precision: (скетчи дней с логами, watermark всех дней)
+        rows = self.conn.execute(
+            """
+            SELECT day, metric, watermark, registers FROM daily_sketches
+            WHERE day BETWEEN ? AND ? AND precision = ?
+            ORDER BY day
+            """,
+            (start_date, end_date, self.precision)).fetchall()
+        watermarks = {}
+        columns = {metric: {} for metric in UNIQUE_METRICS}
+        for day, metric, watermark, registers in rows:
+            day = date.fromisoformat(day)
+            watermarks[day] = watermark
+            if registers is not None and metric in columns:
+                columns[metric][day] = HyperLogLog.from_bytes(registers, self.precision)
+        sketches = pd.DataFrame(columns) if rows else empty_sketches()
+        sketches.index.name = 'day'
+        return sketches.dropna(), watermarks
+
+    def store(self, days, sketches, watermark):
+        rows = []
+        for day in days:
+            for metric in UNIQUE_METRICS:
+                registers = sketches.loc[day, metric].to_bytes() if day in sketches.index else None
+                rows.append((day.isoformat(), metric, self.precision, watermark, registers))
+        self.conn.executemany("INSERT OR REPLACE INTO daily_sketches VALUES (?, ?, ?, ?, ?)", rows)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,435 @@
+import os
+import select
+import sqlite3
+from contextlib import closing
+from datetime import date, timedelta
+
+import pandas as pd
+import psycopg2
+from psycopg2 import sql
+
+
+COUNTER_COLUMNS = [
+    'registrations',
+    'comments',
+    'anonymous_comments',
+    'created_topics',
+    'deleted_topics'
+]
+LOG_DTYPES = {
+    'id': 'Int32',
+    'user_id': 'Int32',
+    'activity_id': 'Int32',
+    'activity_type': 'int8',
+    'server_response': 'int16',
+    'extra': 'category'
+}
+COMMENT_DTYPES = {
+    'id': 'Int32',
+    'parent_id': 'Int32',
+    'topic_id': 'Int32'
+}
+# Полуоткрытый интервал по time вместо DATE(time) BETWEEN, чтобы работал индекс logs_time_idx
+LOGS_QUERY = "SELECT {columns} FROM logs WHERE time >= %s::date AND time < %s::date + 1"
+DAILY_COUNTERS_QUERY = """
+    SELECT DATE(time) AS day,
+           COUNT(*) FILTER (WHERE activity_type = 2 AND user_id IS NOT NULL) AS registrations,
+           COUNT(*) FILTER (WHERE activity_type = 8) AS comments,
+           COUNT(*) FILTER (WHERE activity_type = 8 AND user_id IS NULL) AS anonymous_comments,
+           COUNT(*) FILTER (WHERE activity_type = 5 AND server_response <> 401) AS created_topics,
+           COUNT(*) FILTER (WHERE activity_type = 7) AS deleted_topics
+    FROM logs
+    WHERE time >= %s::date AND time < %s::date + 1
+    GROUP BY DATE(time)
+    ORDER BY day
+"""
+# Режим --follow: новые строки после watermark по первичному ключу, порциями по limit
+LOGS_AFTER_QUERY = "SELECT {columns} FROM logs WHERE id > %s ORDER BY id LIMIT %s"
+# Канал NOTIFY триггера из migrations/002_logs_notify.sql
+LOGS_CHANNEL = 'logs_new'
+# Дерево комментариев и время их создания по логам (activity_id create_comment - id топика)
+COMMENTS_QUERY = "SELECT id, parent_id, topic_id FROM comments"
+COMMENT_LOGS_QUERY = "SELECT id, time, activity_id FROM logs WHERE activity_type = 8"
+STALE_DAYS_QUERY = """
+    SELECT DATE(time) AS day, MAX(id)
+    FROM logs
+    WHERE id > %s AND time >= %s::date AND time < %s::date + 1
+    GROUP BY DATE(time)
+"""
+
+
+def compact_logs(data):
+    # Компактные типы колонок logs: id-шники помещаются в int32 (SERIAL), у типа события
+    # и кода ответа мало значений, extra принимает два значения. Nullable Int32 не превращает
+    # пропуски в float64, как это делает загрузка по умолчанию
+    return data.astype({column: dtype for column, dtype in LOG_DTYPES.items() if column in data})
+
+
+def compact_comments(data):
+    return data.astype(COMMENT_DTYPES)
+
+
+def logs_query(columns=None, query=LOGS_QUERY):
+    if columns is None:
+        return sql.SQL(query).format(columns=sql.SQL('*'))
+    return sql.SQL(query).format(
+        columns=sql.SQL(', ').join(sql.Identifier(column) for column in columns))
+
+
+def extract_logs(
+        postgres_url,
+        postgres_user,
+        postgres_password,
+        postgres_db,
+        start_date,
+        end_date,
+        columns=None):
+    return PostgresSource(postgres_url, postgres_user, postgres_password, postgres_db).read_logs(
+        start_date, end_date, columns)
+
+
+def extract_logs_chunks(
+        postgres_url,
+        postgres_user,
+        postgres_password,
+        postgres_db,
+        start_date,
+        end_date,
+        chunk_size,
+        columns=None):
+    return PostgresSource(postgres_url, postgres_user, postgres_password, postgres_db).read_logs_chunks(
+        start_date, end_date, chunk_size, columns)
+
+
+def extract_daily_counters(
+        postgres_url,
+        postgres_user,
+        postgres_password,
+        postgres_db,
+        start_date,
+        end_date):
+    return PostgresSource(postgres_url, postgres_user, postgres_password, postgres_db).daily_counters(
+        start_date, end_date)
+
+
+def next_day(end_date):
+    return (date.fromisoformat(end_date) + timedelta(days=1)).isoformat()
+
+
+class PostgresSource:
+    # Источники хранят только параметры подключения и открывают соединение на каждый
+    # запрос, поэтому их можно передавать в процессы --workers
+    name = 'postgres'
+
+    def __init__(self, host, user, password, dbname):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.dbname = dbname
+
+    def connect(self):
+        return psycopg2.connect(
+            host=self.host,
+            database=self.dbname,
+            user=self.user,
+            password=self.password
+        )
+
+    def fingerprint(self):
+        # Идентификатор данных для кэшей: счётчики другой базы нельзя отдавать из кэша
+        return f'postgres://{self.host}/{self.dbname}'
+
+    def read_logs(self, start_date, end_date, columns=None):
+        conn = self.connect()
+        try:
+            data = pd.read_sql_query(
+                logs_query(columns).as_string(conn),
+                conn,
+                params=(start_date, end_date))
+        finally:
+            conn.close()
+        return compact_logs(data)
+
+    def read_logs_chunks(self, start_date, end_date, chunk_size, columns=None):
+        # Серверный (именованный) курсор: строки приходят порциями по chunk_size,
+        # в памяти клиента одновременно находится не больше одной порции
+        conn = self.connect()
+        try:
+            with conn.cursor(name='logs_stream') as cur:
+                cur.itersize = chunk_size
+                cur.execute(logs_query(columns), (start_date, end_date))
+                while True:
+                    rows = cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    names = [column.name for column in cur.description]
+                    yield compact_logs(pd.DataFrame.from_records(rows, columns=names))
+        finally:
+            conn.close()
+
+    def daily_counters(self, start_date, end_date):
+        # Счётчики считаются в PostgreSQL, клиент получает одну строку на день
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(DAILY_COUNTERS_QUERY, (start_date, end_date))
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+        counters = pd.DataFrame.from_records(rows, columns=['day'] + COUNTER_COLUMNS)
+        return counters.set_index('day').astype('int64')
+
+    def stale_days(self, watermark, start_date, end_date):
+        # Дни периода, в которых есть строки с id больше watermark, и максимальный id в них
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(STALE_DAYS_QUERY, (watermark, start_date, end_date))
+                return cur.fetchall()
+        finally:
+            conn.close()
+
+    def max_log_id(self):
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT COALESCE(MAX(id), 0) FROM logs")
+                return cur.fetchone()[0]
+        finally:
+            conn.close()
+
+    def read_logs_after(self, watermark, limit, columns=None):
+        conn = self.connect()
+        try:
+            data = pd.read_sql_query(
+                logs_query(columns, LOGS_AFTER_QUERY).as_string(conn),
+                conn,
+                params=(watermark, limit))
+        finally:
+            conn.close()
+        return compact_logs(data)
+
+    def read_query(self, query):
+        conn = self.connect()
+        try:
+            return pd.read_sql_query(query, conn)
+        finally:
+            conn.close()
+
+    def read_comments(self):
+        return compact_comments(self.read_query(COMMENTS_QUERY))
+
+    def read_comment_logs(self):
+        return compact_logs(self.read_query(COMMENT_LOGS_QUERY))
+
+    def explain(self, start_date, end_date, columns=None, pushdown=False):
+        # План запроса выборки с фактическим временем и прочитанными буферами.
+        # EXPLAIN ANALYZE выполняет запрос, поэтому выборка читается ещё раз
+        query = sql.SQL(DAILY_COUNTERS_QUERY) if pushdown else logs_query(columns)
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL('EXPLAIN (ANALYZE, BUFFERS) ') + query, (start_date, end_date))
+                return '\n'.join(row[0] for row in cur.fetchall())
+        finally:
+            conn.close()
+
+
+class SQLiteSource:
+    # Файл SQLite с таблицей logs той же структуры, что в db-init.sql;
+    # time хранится текстом 'YYYY-MM-DD HH:MM:SS', поэтому сравнивается как строка
+    name = 'sqlite'
+    daily_counters_query = """
+        SELECT substr(time, 1, 10) AS day,
+               SUM(activity_type = 2 AND user_id IS NOT NULL),
+               SUM(activity_type = 8),
+               SUM(activity_type = 8 AND user_id IS NULL),
+               SUM(activity_type = 5 AND server_response <> 401),
+               SUM(activity_type = 7)
+        FROM logs
+        WHERE time >= ? AND time < ?
+        GROUP BY day
+        ORDER BY day
+    """
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Файл SQLite не найден: {path}")
+        self.path = path
+
+    def fingerprint(self):
+        return f'sqlite:{os.path.realpath(self.path)}'
+
+    def logs_query(self, columns):
+        selected = '*' if columns is None else ', '.join(f'"{column}"' for column in columns)
+        return f"SELECT {selected} FROM logs WHERE time >= ? AND time < ?"
+
+    def prepare(self, data):
+        if 'time' in data:
+            data['time'] = pd.to_datetime(data['time'])
+        return compact_logs(data)
+
+    def read_logs(self, start_date, end_date, columns=None):
+        with closing(sqlite3.connect(self.path)) as conn:
+            data = pd.read_sql_query(
+                self.logs_query(columns),
+                conn,
+                params=(start_date, next_day(end_date)))
+        return self.prepare(data)
+
+    def read_logs_chunks(self, start_date, end_date, chunk_size, columns=None):
+        with closing(sqlite3.connect(self.path)) as conn:
+            for chunk in pd.read_sql_query(
+                    self.logs_query(columns),
+                    conn,
+                    params=(start_date, next_day(end_date)),
+                    chunksize=chunk_size):
+                yield self.prepare(chunk)
+
+    def daily_counters(self, start_date, end_date):
+        with closing(sqlite3.connect(self.path)) as conn:
+            rows = conn.execute(self.daily_counters_query, (start_date, next_day(end_date))).fetchall()
+        counters = pd.DataFrame.from_records(rows, columns=['day'] + COUNTER_COLUMNS)
+        counters['day'] = [date.fromisoformat(day) for day in counters['day']]
+        return counters.set_index('day').astype('int64')
+
+    def stale_days(self, watermark, start_date, end_date):
+        with closing(sqlite3.connect(self.path)) as conn:
+            rows = conn.execute("""
+                SELECT substr(time, 1, 10) AS day, MAX(id)
+                FROM logs
+                WHERE id > ? AND time >= ? AND time < ?
+                GROUP BY day
+            """, (watermark, start_date, next_day(end_date))).fetchall()
+        return [(date.fromisoformat(day), max_id) for day, max_id in rows]
+
+    def max_log_id(self):
+        with closing(sqlite3.connect(self.path)) as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM logs").fetchone()[0]
+
+    def read_logs_after(self, watermark, limit, columns=None):
+        selected = '*' if columns is None else ', '.join(f'"{column}"' for column in columns)
+        with closing(sqlite3.connect(self.path)) as conn:
+            data = pd.read_sql_query(
+                f"SELECT {selected} FROM logs WHERE id > ? ORDER BY id LIMIT ?",
+                conn,
+                params=(watermark, limit))
+        return self.prepare(data)
+
+    def read_comments(self):
+        with closing(sqlite3.connect(self.path)) as conn:
+            return compact_comments(pd.read_sql_query(COMMENTS_QUERY, conn))
+
+    def read_comment_logs(self):
+        with closing(sqlite3.connect(self.path)) as conn:
+            return self.prepare(pd.read_sql_query(COMMENT_LOGS_QUERY, conn))
+
+    def explain(self, start_date, end_date, columns=None, pushdown=False):
+        # SQLite не выполняет запрос для плана, фактического времени в нём нет
+        query = self.daily_counters_query if pushdown else self.logs_query(columns)
+        with closing(sqlite3.connect(self.path)) as conn:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", (start_date, next_day(end_date))).fetchall()
+        return '\n'.join(row[-1] for row in rows)
+
+
+class ParquetSource:
+    # Каталог, записанный db-generate-data.py --export_format parquet: логи лежат в
+    # logs/day=YYYY-MM-DD/*.parquet. Фильтр по day отсекает ненужные каталоги
+    # (partition pruning), а columns читает только нужные колонки
+    name = 'parquet'
+
+    def __init__(self, path):
+        if not os.path.isdir(os.path.join(path, 'logs')):
+            raise FileNotFoundError(f"В каталоге {path} нет данных logs в формате Parquet")
+        self.path = path
+
+    def fingerprint(self):
+        return f'parquet:{os.path.realpath(self.path)}'
+
+    def dataset(self):
+        # pyarrow нужен только для файловых источников
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        return ds.dataset(
+            os.path.join(self.path, 'logs'),
+            format='parquet',
+            partitioning=ds.partitioning(pa.schema([('day', pa.string())]), flavor='hive'))
+
+    def day_filter(self, start_date, end_date):
+        import pyarrow.dataset as ds
+        return (ds.field('day') >= start_date) & (ds.field('day') <= end_date)
+
+    def read_logs(self, start_date, end_date, columns=None):
+        dataset = self.dataset()
+        if columns is None:
+            columns = [column for column in dataset.schema.names if column != 'day']
+        table = dataset.to_table(columns=columns, filter=self.day_filter(start_date, end_date))
+        return compact_logs(table.to_pandas())
+
+    def read_logs_chunks(self, start_date, end_date, chunk_size, columns=None):
+        dataset = self.dataset()
+        if columns is None:
+            columns = [column for column in dataset.schema.names if column != 'day']
+        for batch in dataset.to_batches(
+                columns=columns,
+                filter=self.day_filter(start_date, end_date),
+                batch_size=chunk_size):
+            if batch.num_rows:
+                yield compact_logs(batch.to_pandas())
+
+    def read_logs_after(self, watermark, limit, columns=None):
+        # Фильтр по id отсекает файлы и группы строк по статистике min/max колонки id
+        import pyarrow.dataset as ds
+        dataset = self.dataset()
+        if columns is None:
+            columns = [column for column in dataset.schema.names if column != 'day']
+        table = dataset.to_table(columns=columns, filter=ds.field('id') > watermark)
+        return compact_logs(table.sort_by('id').slice(0, limit).to_pandas())
+
+    def read_comments(self):
+        import pyarrow.dataset as ds
+        table = ds.dataset(os.path.join(self.path, 'comments'), format='parquet').to_table(
+            columns=list(COMMENT_DTYPES))
+        return compact_comments(table.to_pandas())
+
+    def read_comment_logs(self):
+        import pyarrow.dataset as ds
+        table = self.dataset().to_table(columns=['id', 'time', 'activity_id'], filter=ds.field('activity_type') == 8)
+        return compact_logs(table.to_pandas())
+
+    def stale_days(self, watermark, start_date, end_date):
+        import pyarrow.dataset as ds
+        table = self.dataset().to_table(
+            columns=['id', 'day'],
+            filter=self.day_filter(start_date, end_date) & (ds.field('id') > watermark))
+        if not table.num_rows:
+            return []
+        max_ids = table.to_pandas().groupby('day')['id'].max()
+        return [(date.fromisoformat(day), int(max_id)) for day, max_id in max_ids.items()]
+
+    def max_log_id(self):
+        import pyarrow.compute as pc
+        max_id = pc.max(self.dataset().to_table(columns=['id'])['id']).as_py()
+        return max_id or 0
+
+
+class LogsListener:
+    # Ожидание NOTIFY о новых строках logs для --follow --notify. Отдельное соединение
+    # в режиме autocommit держится открытым всё время работы
+    def __init__(self, source, channel=LOGS_CHANNEL):
+        self.conn = source.connect()
+        self.conn.autocommit = True
+        with self.conn.cursor() as cur:
+            cur.execute(sql.SQL('LISTEN {}').format(sql.Identifier(channel)))
+
+    def wait(self, timeout):
+        # True, если пришло уведомление, False - по истечении timeout секунд
+        if select.select([self.conn], [], [], timeout) == ([], [], []):
+            return False
+        self.conn.poll()
+        notified = bool(self.conn.notifies)
+        self.conn.notifies.clear()
+        return notified
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,46 @@
+import os
+import sqlite3
+import sys
+from contextlib import closing
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import synthetic_logs  # noqa: E402
+
+
+ROWS = 20000
+DAYS = 30
+START_DATE = '2025-01-01'
+END_DATE = '2025-01-30'
+
+
+@pytest.fixture(scope='session')
+def logs():
+    return synthetic_logs(ROWS, DAYS, START_DATE, seed=1, with_text=True)
+
+
+@pytest.fixture(scope='session')
+def sqlite_path(tmp_path_factory, logs):
+    # Таблица logs той же структуры, что в выгрузке генератора в SQLite
+    path = str(tmp_path_factory.mktemp('sqlite') / 'forum.sqlite')
+    data = logs.assign(time=logs['time'].dt.strftime('%Y-%m-%d %H:%M:%S'))
+    data = data.astype(object).where(data.notna(), None)
+    with closing(sqlite3.connect(path)) as conn:
+        conn.executescript("""
+            CREATE TABLE logs (
+                id INTEGER PRIMARY KEY,
+                time TEXT NOT NULL,
+                user_id INTEGER,
+                activity_type INTEGER NOT NULL,
+                activity_id INTEGER,
+                server_response INTEGER NOT NULL,
+                cookie TEXT,
+                extra TEXT
+            );
+            CREATE INDEX logs_time_idx ON logs (time);
+        """)
+        conn.executemany("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", data.itertuples(index=False))
+        conn.commit()
+    return path
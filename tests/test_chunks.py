@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+
+from conftest import END_DATE, START_DATE
+from script import REPORT_COLUMNS, build_report, fold_counters, read_counters
+from sources import SQLiteSource
+
+
+@pytest.mark.parametrize('chunk_size', [97, 1000, 20000])
+def test_fold_counters_over_chunks_matches_frame(logs, chunk_size):
+    chunks = [logs.iloc[start:start + chunk_size] for start in range(0, len(logs), chunk_size)]
+    expected = fold_counters(logs)
+    counters = fold_counters(chunks)
+    pd.testing.assert_frame_equal(counters, expected)
+    pd.testing.assert_frame_equal(build_report(counters), build_report(expected))
+
+
+def test_sqlite_read_logs_chunks_matches_read_logs(sqlite_path):
+    source = SQLiteSource(sqlite_path)
+    data = source.read_logs(START_DATE, END_DATE, REPORT_COLUMNS)
+    chunks = list(source.read_logs_chunks(START_DATE, END_DATE, 1234, REPORT_COLUMNS))
+    assert max(len(chunk) for chunk in chunks) == 1234
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), data)
+
+
+def test_chunked_report_matches_in_memory_report(sqlite_path):
+    source = SQLiteSource(sqlite_path)
+    expected = read_counters(source, START_DATE, END_DATE)
+    assert len(expected) == 30
+    # Порция меньше числа строк за день: счётчики дня складываются из нескольких порций
+    pd.testing.assert_frame_equal(read_counters(source, START_DATE, END_DATE, chunk_size=250), expected)
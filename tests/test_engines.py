@@ -0,0 +1,56 @@
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import END_DATE, START_DATE
+from engines import DuckDBEngine
+from script import build_report, read_counters
+from sources import ParquetSource, SQLiteSource
+
+duckdb = pytest.importorskip('duckdb')
+pa = pytest.importorskip('pyarrow')
+
+
+@pytest.fixture(scope='module')
+def parquet_path(tmp_path_factory, logs):
+    # Каталог в формате выгрузки генератора: logs/day=YYYY-MM-DD/*.parquet
+    import pyarrow.dataset as ds
+    path = str(tmp_path_factory.mktemp('parquet'))
+    data = logs.assign(day=logs['time'].dt.strftime('%Y-%m-%d'))
+    ds.write_dataset(
+        pa.Table.from_pandas(data, preserve_index=False),
+        os.path.join(path, 'logs'),
+        format='parquet',
+        partitioning=ds.partitioning(pa.schema([('day', pa.string())]), flavor='hive'))
+    return path
+
+
+def engine_counters(source, start_date, end_date, **options):
+    try:
+        return DuckDBEngine(source, **options).daily_counters(start_date, end_date)
+    except duckdb.IOException as error:
+        # Расширения DuckDB (sqlite, postgres) скачиваются при первом ATTACH
+        pytest.skip(f'расширение DuckDB недоступно: {error}')
+
+
+@pytest.mark.parametrize('start_date, end_date', [(START_DATE, END_DATE), ('2025-01-07', '2025-01-13')])
+def test_parquet_engines_match(parquet_path, start_date, end_date):
+    source = ParquetSource(parquet_path)
+    expected = read_counters(source, start_date, end_date)
+    counters = engine_counters(source, start_date, end_date, memory_limit='256MB', threads=2)
+    pd.testing.assert_frame_equal(counters, expected)
+    pd.testing.assert_frame_equal(build_report(counters), build_report(expected))
+
+
+def test_parquet_engine_with_small_memory_limit(parquet_path, tmp_path):
+    source = ParquetSource(parquet_path)
+    counters = engine_counters(source, START_DATE, END_DATE, memory_limit='64MB', threads=1,
+                               temp_directory=str(tmp_path))
+    pd.testing.assert_frame_equal(counters, read_counters(source, START_DATE, END_DATE))
+
+
+def test_sqlite_engines_match(sqlite_path):
+    source = SQLiteSource(sqlite_path)
+    counters = engine_counters(source, START_DATE, END_DATE)
+    pd.testing.assert_frame_equal(counters, read_counters(source, START_DATE, END_DATE))
@@ -0,0 +1,71 @@
+import os
+
+import psycopg2
+import pytest
+
+from conftest import START_DATE
+from script import REPORT_COLUMNS
+from sources import PostgresSource, SQLiteSource
+
+
+PERIOD = (START_DATE, '2025-01-07')
+SCHEMA = 'explain_test'
+
+
+@pytest.mark.parametrize('pushdown', [False, True])
+def test_sqlite_period_filter_uses_time_index(sqlite_path, pushdown):
+    plan = SQLiteSource(sqlite_path).explain(*PERIOD, REPORT_COLUMNS, pushdown=pushdown)
+    assert 'USING INDEX logs_time_idx' in plan
+
+
+@pytest.fixture
+def postgres_source(logs, monkeypatch):
+    # Таблица logs с индексом по time в отдельной схеме, источник находит её через search_path.
+    # Параметры подключения - как у script.py, из PGHOST, PGUSER, PGPASSWORD, PGDATABASE
+    source = PostgresSource(
+        os.environ.get('PGHOST', 'localhost'),
+        os.environ.get('PGUSER', 'postgres'),
+        os.environ.get('PGPASSWORD', 'postgres'),
+        os.environ.get('PGDATABASE', 'forum'))
+    try:
+        conn = source.connect()
+    except psycopg2.OperationalError:
+        pytest.skip('PostgreSQL недоступен')
+    data = logs.assign(time=logs['time'].dt.strftime('%Y-%m-%d %H:%M:%S'))
+    data = data.astype(object).where(data.notna(), None)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {SCHEMA}")
+            cur.execute(f"""
+                CREATE TABLE {SCHEMA}.logs (
+                    id INTEGER PRIMARY KEY,
+                    time TIMESTAMP NOT NULL,
+                    user_id INTEGER,
+                    activity_type INTEGER NOT NULL,
+                    activity_id INTEGER,
+                    server_response INTEGER NOT NULL,
+                    cookie VARCHAR(32),
+                    extra VARCHAR(255)
+                )
+            """)
+            cur.executemany(
+                f"INSERT INTO {SCHEMA}.logs VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                list(data.itertuples(index=False)))
+            cur.execute(f"CREATE INDEX logs_time_idx ON {SCHEMA}.logs (time)")
+            cur.execute(f"ANALYZE {SCHEMA}.logs")
+        conn.commit()
+        monkeypatch.setenv('PGOPTIONS', f'-c search_path={SCHEMA}')
+        yield source
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
+
+
+@pytest.mark.parametrize('pushdown', [False, True])
+def test_postgres_period_filter_uses_time_index(postgres_source, pushdown):
+    plan = postgres_source.explain(*PERIOD, REPORT_COLUMNS, pushdown=pushdown)
+    assert 'logs_time_idx' in plan
+    assert 'Seq Scan on logs' not in plan
@@ -0,0 +1,128 @@
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta
+
+import pytest
+
+from benchmark import load_generator
+
+
+EMPTY_STATE = {'user_ids': [], 'logged_users': [], 'user_cookies': {}, 'topic_ids': [], 'comment_ids': {}}
+
+
+@pytest.fixture(scope='module')
+def generator_module():
+    pytest.importorskip('faker')
+    pytest.importorskip('psycopg2')
+    previous = os.getcwd()
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        return load_generator()
+    finally:
+        os.chdir(previous)
+
+
+def test_ranges_share_population(generator_module, tmp_path):
+    # Те же шаги, что generate_parallel, но отрезки пишутся в файл SQLite по очереди,
+    # с последнего: id событий поздних дней меньше, чем у ранних, как при параллельной записи
+    module = generator_module
+    path = str(tmp_path / 'forum.sqlite')
+    options = {
+        'dbname': None, 'postgres_user': None, 'postgres_password': None, 'postgres_host': None,
+        'postgres_port': None, 'export_format': 'sqlite', 'export_path': path, 'pool_size': 50
+    }
+    start_date = datetime(2025, 1, 1)
+    planner = module.DataGenerator(**options, seed=3)
+    planner.set_state(EMPTY_STATE)
+    plans = planner.plan_population(start_date, start_date + timedelta(days=11))
+    planner.cleanup()
+
+    states = [module.range_state(EMPTY_STATE, plans, first_day) for first_day in (0, 4, 8)]
+    for index in reversed(range(3)):
+        generator = module.DataGenerator(**options, seed=4 + index)
+        generator.set_state(states[index])
+        first_date = start_date + timedelta(days=4 * index)
+        generator.generate_range_data(first_date, first_date + timedelta(days=3), plans[4 * index:4 * index + 4])
+        generator.cleanup()
+
+    # Отрезки после первого начинаются с пользователями и топиками предыдущих дней
+    assert [len(state['user_ids']) for state in states] == [
+        sum(len(plan['users']) for plan in plans[:first_day]) for first_day in (0, 4, 8)]
+    for state, first_day in zip(states, (0, 4, 8)):
+        created = {topic_id for plan in plans[:first_day] for topic_id, _ in plan['topics']}
+        deleted = {topic_id for plan in plans[:first_day] for topic_id, _ in plan['deletions']}
+        assert set(state['topic_ids']) == created - deleted
+    assert states[1]['topic_ids'] and states[2]['topic_ids']
+
+    with closing(sqlite3.connect(path)) as conn:
+        def count(query):
+            return conn.execute(query).fetchone()[0]
+
+        assert count("SELECT COUNT(*) FROM logs WHERE activity_type = 2") == count("SELECT COUNT(*) FROM users")
+        assert count("SELECT COUNT(*) FROM logs WHERE activity_type = 5 AND server_response = 201") \
+            == count("SELECT COUNT(*) FROM topics")
+        assert count("""
+            SELECT COUNT(*) FROM logs l JOIN topics t ON t.id = l.activity_id
+            WHERE l.activity_type = 5 AND l.server_response = 201 AND l.user_id <> t.user_id
+        """) == 0
+        # Топик удаляется один раз, и в следующие дни после удаления событий по нему нет
+        assert count("""
+            SELECT COUNT(*) - COUNT(DISTINCT activity_id) FROM logs WHERE activity_type = 7
+        """) == 0
+        assert count("""
+            SELECT COUNT(*) FROM logs l
+            JOIN logs d ON d.activity_type = 7 AND d.activity_id = l.activity_id
+            WHERE l.activity_type IN (6, 8) AND date(l.time) > date(d.time)
+        """) == 0
+        # Пользователи первых отрезков действуют в последующих
+        assert count("""
+            SELECT COUNT(*) FROM logs l
+            JOIN logs r ON r.user_id = l.user_id AND r.activity_type = 2
+            WHERE l.time >= '2025-01-09' AND r.time < '2025-01-05'
+        """) > 0
+        assert count("""
+            SELECT COUNT(*) FROM logs l
+            JOIN logs r ON r.user_id = l.user_id AND r.activity_type = 2
+            WHERE l.time < r.time
+        """) == 0
+        assert count("""
+            SELECT COUNT(*) FROM (
+                SELECT time < LAG(time) OVER (PARTITION BY user_id, date(time) ORDER BY id) AS backwards
+                FROM logs
+                WHERE user_id IS NOT NULL
+            ) user_events
+            WHERE backwards
+        """) == 0
+
+
+def test_profile_accepts_float_counts(generator_module, tmp_path):
+    path = tmp_path / 'profile.json'
+    path.write_text('{"registration_count": 1e6, "login_count": 1000000.0, "activity_count": [10.5, 20]}')
+    profile = generator_module.load_profile(str(path), scale=1.5)
+    assert profile['registration_count'] == 1500000
+    assert profile['login_count'] == 1500000
+    assert profile['activity_count'] == [16, 30]
+    assert profile['error_count'] == [3, 8]
+    generator = generator_module.DataGenerator(
+        None, None, None, None, None, export_format='sqlite', export_path=str(tmp_path / 'forum.sqlite'),
+        profile={'login_count': 7.6, 'activity_count': [1.0, 2.0]})
+    assert generator.draw_count(generator.profile['login_count']) == 8
+    assert generator.draw_count(generator.profile['activity_count']) in (1, 2)
+    generator.cleanup()
+
+
+@pytest.mark.parametrize('content, message', [
+    ('{"registration_cnt": 5}', 'неизвестные ключи registration_cnt'),
+    ('{"login_count": "many"}', 'login_count'),
+    ('{"login_count": [1, 2, 3]}', 'login_count'),
+    ('{"login_count": [5, 1]}', 'login_count'),
+    ('{"login_count": true}', 'login_count'),
+    ('{"error_rate": "high"}', 'error_rate'),
+    ('[1, 2]', 'JSON-объект')
+])
+def test_profile_rejects_invalid_values(generator_module, tmp_path, content, message):
+    path = tmp_path / 'profile.json'
+    path.write_text(content)
+    with pytest.raises(ValueError, match=message):
+        generator_module.load_profile(str(path))
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import END_DATE
+from script import extract_sketches_cached, read_sketches
+from sketches import (
+    UNIQUE_METRICS,
+    HyperLogLog,
+    SketchStore,
+    daily_sketches,
+    history_start,
+    merge_sketches,
+    range_uniques,
+    uniques_report
+)
+from sources import SQLiteSource
+
+
+PRECISION = 14
+# Допуск - четыре стандартные ошибки 1.04 / sqrt(2^precision)
+TOLERANCE = 4 * 1.04 / np.sqrt(2 ** PRECISION)
+
+
+def exact_uniques(data):
+    # Точные значения метрик UNIQUE_METRICS по тем же определениям, что в unique_keys
+    named = data['user_id'].notna()
+    comments = data[data['activity_type'] == 8]
+    commenters = comments['user_id'].astype('string').where(comments['user_id'].notna(), 'c' + comments['cookie'])
+    return {
+        'dau': data.loc[named, 'user_id'].nunique(),
+        'unique_visitors': data['cookie'].nunique(),
+        'unique_commenters': commenters.nunique()
+    }
+
+
+def assert_close(estimate, exact):
+    assert abs(estimate - exact) <= max(TOLERANCE * exact, 1), (estimate, exact)
+
+
+@pytest.mark.parametrize('count', [10, 1000, 30000, 300000])
+def test_estimate_error_is_bounded(count):
+    hashes = pd.util.hash_array(np.arange(count, dtype=np.int64))
+    assert_close(HyperLogLog(PRECISION).add_hashes(hashes).estimate(), count)
+
+
+def test_empty_sketch_estimates_zero():
+    assert HyperLogLog(PRECISION).estimate() == 0
+
+
+def test_daily_estimates_match_exact_counts(logs):
+    sketches = daily_sketches(logs, PRECISION)
+    days = logs['time'].dt.date
+    for day, data in logs.groupby(days):
+        exact = exact_uniques(data)
+        for metric in UNIQUE_METRICS:
+            assert_close(sketches.loc[day, metric].estimate(), exact[metric])
+    totals = range_uniques(sketches)
+    for metric, exact in exact_uniques(logs).items():
+        assert_close(totals[metric], exact)
+
+
+def test_chunk_merge_equals_single_pass(logs):
+    expected = daily_sketches(logs, PRECISION)
+    merged = None
+    for start in range(0, len(logs), 3000):
+        merged = merge_sketches(merged, daily_sketches(logs.iloc[start:start + 3000], PRECISION))
+    assert list(merged.index) == list(expected.index)
+    for metric in UNIQUE_METRICS:
+        for left, right in zip(merged[metric], expected[metric]):
+            np.testing.assert_array_equal(left.registers, right.registers)
+
+
+def test_rolling_windows_cover_days_before_start(sqlite_path, tmp_path, logs):
+    # Окно на первый день периода включает дни до start_date
+    source = SQLiteSource(sqlite_path)
+    start_date = '2025-01-10'
+    store = SketchStore(str(tmp_path / 'sketches.sqlite'), PRECISION)
+    try:
+        sketches = extract_sketches_cached(source, history_start(start_date), END_DATE, store)
+    finally:
+        store.close()
+    report = uniques_report(sketches, start_date).set_index('date')
+    assert str(report.index[0]) == start_date
+    full = uniques_report(read_sketches(source, '2025-01-01', END_DATE, PRECISION)).set_index('date')
+    pd.testing.assert_frame_equal(report, full.loc[report.index])
+
+    days = logs['time'].dt.date
+    first = report.index[0]
+    window = logs[(days > first - pd.Timedelta(days=7).to_pytimedelta()) & (days <= first)]
+    assert_close(report.loc[first, 'dau_7d'], exact_uniques(window)['dau'])
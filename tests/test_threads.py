@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from threads import THREAD_COLUMNS, CommentForest, comment_times, thread_stats
+
+
+def small_forest():
+    # Топик 1: 1 <- 2 <- 4 и 1 <- 3, топик 2: 5 <- 6, топик 3: 7 без лога
+    return pd.DataFrame({
+        'id': [1, 2, 3, 4, 5, 6, 7],
+        'topic_id': [1, 1, 1, 1, 2, 2, 3],
+        'parent_id': pd.array([None, 1, 1, 2, None, 5, None], dtype='Int64')
+    })
+
+
+def small_comment_logs():
+    # Логи create_comment записаны в порядке id комментариев, но время не растёт вместе с id:
+    # комментарий 3 создан раньше комментария 2
+    return pd.DataFrame({
+        'id': [10, 11, 12, 13, 14, 15],
+        'activity_id': [1, 1, 1, 1, 2, 2],
+        'time': pd.to_datetime([
+            '2025-01-01 12:00', '2025-01-01 12:30', '2025-01-01 12:10', '2025-01-01 13:30',
+            '2025-01-02 10:00', '2025-01-02 10:45'
+        ])
+    })
+
+
+def test_forest_structure():
+    forest = CommentForest(small_forest())
+    assert forest.depth().tolist() == [0, 1, 1, 2, 0, 1, 0]
+    assert forest.subtree_sizes().tolist() == [4, 2, 1, 1, 2, 1, 1]
+    assert forest.fan_out.tolist() == [2, 1, 0, 0, 1, 0, 0]
+
+
+def test_comment_times_follow_log_ids():
+    forest = CommentForest(small_forest())
+    times = comment_times(forest, small_comment_logs())
+    expected = small_comment_logs()['time'].to_numpy(dtype='datetime64[ns]')
+    np.testing.assert_array_equal(times[:6], expected)
+    assert np.isnat(times[6])
+
+
+def test_thread_stats_reply_latency():
+    stats = thread_stats(small_forest(), small_comment_logs()).set_index('topic_id')
+    assert list(stats.reset_index().columns) == THREAD_COLUMNS
+    assert stats.loc[1, ['comments', 'threads', 'replies', 'max_depth', 'largest_thread', 'max_fan_out']].tolist() \
+        == [4, 1, 3, 2, 4, 2]
+    # Задержки ответов топика 1: 30, 10 и 60 минут
+    assert stats.loc[1, 'avg_reply_latency_minutes'] == 33.33
+    assert stats.loc[1, 'median_reply_latency_minutes'] == 30
+    assert stats.loc[2, 'avg_reply_latency_minutes'] == 45
+    assert np.isnan(stats.loc[3, 'avg_reply_latency_minutes'])
@@ -0,0 +1,23 @@
+import pandas as pd
+import pytest
+
+from conftest import END_DATE, START_DATE
+from script import build_report, extract_counters_parallel, read_counters
+from sources import SQLiteSource
+
+
+@pytest.mark.parametrize('workers', [1, 2, 8])
+def test_parallel_counters_match_single_process(sqlite_path, workers):
+    source = SQLiteSource(sqlite_path)
+    expected = read_counters(source, START_DATE, END_DATE)
+    # Отрезки по 3 дня: накопленное число топиков переходит через границы отрезков
+    counters = extract_counters_parallel(source, START_DATE, END_DATE, workers, shard_days=3)
+    pd.testing.assert_frame_equal(counters.sort_index(), expected)
+    pd.testing.assert_frame_equal(build_report(counters), build_report(expected))
+
+
+def test_parallel_chunked_counters_match_single_process(sqlite_path):
+    source = SQLiteSource(sqlite_path)
+    expected = read_counters(source, START_DATE, END_DATE)
+    counters = extract_counters_parallel(source, START_DATE, END_DATE, 4, shard_days=1, chunk_size=100)
+    pd.testing.assert_frame_equal(counters.sort_index(), expected)
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+
+THREAD_COLUMNS = [
+    'topic_id',
+    'comments',
+    'threads',
+    'replies',
+    'max_depth',
+    'largest_thread',
+    'max_fan_out',
+    'avg_reply_latency_minutes',
+    'median_reply_latency_minutes'
+]
+
+
+class CommentForest:
+    # Лес комментариев по parent_id в виде массивов numpy. Комментарии хранятся по возрастанию
+    # id, ссылки на родителя - позиции в этих массивах (-1 у корня). Дочерние комментарии
+    # лежат в индексе CSR: дети комментария i - children[indptr[i]:indptr[i + 1]].
+    # Обход идёт по уровням: каждый уровень получается из предыдущего одной выборкой
+    # из CSR, поэтому глубина и размеры поддеревьев считаются за линейное время
+    def __init__(self, comments):
+        comments = comments.sort_values('id')
+        self.ids = comments['id'].to_numpy(dtype=np.int64)
+        self.topic_ids = comments['topic_id'].to_numpy(dtype=np.int64)
+        parent_ids = comments['parent_id'].to_numpy(dtype=np.int64, na_value=-1)
+        # Ссылка на отсутствующий комментарий считается корнем
+        parent = np.searchsorted(self.ids, parent_ids)
+        found = (parent_ids >= 0) & (parent < len(self.ids))
+        found[found] = self.ids[parent[found]] == parent_ids[found]
+        self.parent = np.where(found, parent, -1)
+
+        replies = np.flatnonzero(self.parent >= 0)
+        self.children = replies[np.argsort(self.parent[replies], kind='stable')]
+        self.fan_out = np.bincount(self.parent[replies], minlength=len(self.ids))
+        self.indptr = np.append(0, np.cumsum(self.fan_out))
+        self.levels = list(self.iter_levels())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def iter_levels(self):
+        # Позиции комментариев по уровням: корни, ответы на корни и так далее.
+        # Комментарии в цикле по parent_id недостижимы от корней и не попадают ни в один уровень
+        level = np.flatnonzero(self.parent < 0)
+        while len(level):
+            yield level
+            starts = self.indptr[level]
+            counts = self.fan_out[level]
+            total = counts.sum()
+            # Отрезки CSR всех комментариев уровня одним массивом индексов
+            offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+            level = self.children[offsets]
+
+    def depth(self):
+        # Глубина: 0 у корня, -1 у недостижимых комментариев
+        depth = np.full(len(self), -1, dtype=np.int64)
+        for number, level in enumerate(self.levels):
+            depth[level] = number
+        return depth
+
+    def subtree_sizes(self):
+        # Число комментариев в поддереве, включая сам комментарий: размеры переносятся
+        # к родителям от самого глубокого уровня к корням
+        sizes = np.ones(len(self), dtype=np.int64)
+        for level in reversed(self.levels[1:]):
+            np.add.at(sizes, self.parent[level], sizes[level])
+        return sizes
+
+    def roots(self):
+        return self.levels[0] if self.levels else np.array([], dtype=np.int64)
+
+
+def comment_times(forest, comment_logs):
+    # Время создания комментариев по логам create_comment. В логе записан только id топика,
+    # поэтому k-й по id лог топика сопоставляется с k-м по id комментарием топика: генератор
+    # пишет лог сразу после строки комментария, а время комментариев не растёт вместе с id.
+    # Для топиков, где число логов и комментариев не совпадает, время не определено (NaT)
+    logs = pd.DataFrame({
+        'topic_id': comment_logs['activity_id'].to_numpy(dtype=np.int64, na_value=-1),
+        'time': comment_logs['time'].to_numpy(),
+        'id': comment_logs['id'].to_numpy(dtype=np.int64)
+    }).sort_values(['topic_id', 'id'])
+    logs['rank'] = logs.groupby('topic_id').cumcount()
+    comments = pd.DataFrame({'topic_id': forest.topic_ids, 'id': forest.ids})
+    comments['rank'] = comments.groupby('topic_id').cumcount()
+    logs_count = logs['topic_id'].value_counts()
+    comments_count = comments['topic_id'].value_counts()
+    matched = comments_count.index[comments_count.eq(logs_count.reindex(comments_count.index))]
+    times = comments.merge(logs[logs['topic_id'].isin(matched)], on=['topic_id', 'rank'], how='left')['time']
+    return times.to_numpy(dtype='datetime64[ns]')
+
+
+def thread_stats(comments, comment_logs=None):
+    # Метрики обсуждений по топикам: комментарии, ветки (комментарии без родителя), ответы,
+    # наибольшая глубина ответа, размер самой большой ветки, наибольшее число прямых ответов
+    # на один комментарий и задержка ответа (от родителя до ответа) по логам create_comment
+    if comments.empty:
+        return pd.DataFrame(columns=THREAD_COLUMNS)
+    forest = CommentForest(comments)
+    depth = forest.depth()
+    nodes = pd.DataFrame({
+        'topic_id': forest.topic_ids,
+        'root': forest.parent < 0,
+        'reply': forest.parent >= 0,
+        'depth': depth,
+        'thread_size': np.where(forest.parent < 0, forest.subtree_sizes(), 0),
+        'fan_out': forest.fan_out
+    })
+    if comment_logs is not None:
+        times = comment_times(forest, comment_logs)
+        parent_times = times[np.maximum(forest.parent, 0)]
+        latency = (times - parent_times) / np.timedelta64(1, 'm')
+        nodes['latency'] = np.where(forest.parent >= 0, latency, np.nan)
+    else:
+        nodes['latency'] = np.nan
+    grouped = nodes.groupby('topic_id')
+    stats = pd.DataFrame({
+        'comments': grouped.size(),
+        'threads': grouped['root'].sum(),
+        'replies': grouped['reply'].sum(),
+        'max_depth': grouped['depth'].max(),
+        'largest_thread': grouped['thread_size'].max(),
+        'max_fan_out': grouped['fan_out'].max(),
+        'avg_reply_latency_minutes': round(grouped['latency'].mean(), 2),
+        'median_reply_latency_minutes': round(grouped['latency'].median(), 2)
+    })
+    return stats.reset_index()[THREAD_COLUMNS]